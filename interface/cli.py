@@ -5,10 +5,16 @@ Why this file exists:
 > This is where users will interact with the app from the terminal. For now, it just initializes the database so I can check that everything is wired up correctly. As I learn more, I'll add commands for adding, viewing, and managing cards.
 """
 
-from pokeport.storage import init_db, add_card, get_all_cards
+import os
+import time
+
+from pokeport.storage import init_db, add_card, get_all_cards, get_portfolio_summary
 from pokeport.models import PokemonCard
 from pokeport.grading import estimate_psa_grade
+from pokeport.roi import calculate_roi
 from pokeport.api import search_cards_by_name, search_cards_advanced, get_sets_for_cards, filter_cards_by_set, filter_cards_by_rarity, display_card_options, get_card_details, suggest_promo_search, get_promo_sets_for_cards
+from pokeport.image_cache import prefetch_collection
+from pokeport.cache_warmer import start_cache_warmer
 
 # Initialize the database when running this script.
 # This is a good first test to make sure the DB setup works!
@@ -25,6 +31,9 @@ def main_menu():
         print("2. Add a new card manually")
         print("3. View all cards in collection")
         print("4. Estimate a card's grade (PSA style)")
+        print("5. Download card images for offline viewing")
+        print("6. Estimate grades from a folder of card scans")
+        print("7. Collection analytics (ROI by set, grade spread)")
         print("0. Exit")
         choice = input("Choose an option: ").strip()
         if choice == "1":
@@ -35,11 +44,17 @@ def main_menu():
             run_view_cards()
         elif choice == "4":
             run_grading_estimator()
+        elif choice == "5":
+            run_prefetch_images()
+        elif choice == "6":
+            run_grade_scans()
+        elif choice == "7":
+            run_collection_analytics()
         elif choice == "0":
             print("Goodbye! (Back to building more features soon)")
             break
         else:
-            print("Invalid choice. Please enter 1, 2, 3, 4, or 0.")
+            print("Invalid choice. Please enter 1, 2, 3, 4, 5, 6, 7, or 0.")
 
 def run_add_card_with_api():
     """Add a new Pokemon card using API search for accurate data."""
@@ -155,7 +170,8 @@ def run_add_card_with_api():
             purchase_price=purchase_price,
             market_value=market_value,
             grading_score=grading_score,
-            image_url=card_details['image_url']
+            image_url=card_details['image_url'],
+            api_id=card_details['api_id'] or None
         )
         
         # Save to database
@@ -232,13 +248,18 @@ def run_view_cards():
         if not cards:
             print("No cards in your collection yet. Add some cards first!")
         else:
-            print(f"Total cards: {len(cards)}")
+            # Headline totals come from the running summary table, not from adding up every card
+            summary = get_portfolio_summary()
+            print(f"Total cards: {summary['card_count']} ({len(cards)} different)")
+            roi = calculate_roi(summary["total_cost"], summary["total_value"])
+            print(f"Total cost: ${summary['total_cost']:.2f} | Total value: ${summary['total_value']:.2f} | ROI: {roi * 100:.1f}%")
             print("-" * 60)
             for card in cards:
                 print(f"ID: {card.id}")
                 print(f"Name: {card.name}")
                 print(f"Set: {card.set_name}")
                 print(f"Rarity: {card.rarity}")
+                print(f"Quantity: {card.quantity}")
                 print(f"Purchase: ${card.purchase_price:.2f}")
                 print(f"Market Value: ${card.market_value:.2f}")
                 print(f"Grade: {card.grading_score:.2f}")
@@ -265,5 +286,72 @@ def run_grading_estimator():
     print(explanation)
     print("---\n")
 
+def run_prefetch_images():
+    """Download the image of every card in the collection into the local image cache."""
+    print("\n--- Download Card Images ---")
+    try:
+        prefetch_collection()
+    except Exception as e:
+        print(f"❌ Error downloading images: {e}")
+    print("---\n")
+
+def run_grade_scans():
+    """Estimate grades for every scanned card image in a folder."""
+    print("\n--- Grade Card Scans ---")
+    try:
+        # Imported here so the rest of the CLI still works without NumPy/Pillow installed
+        from pokeport.image_grading import grade_folder, print_timing_report
+    except ImportError:
+        print("❌ Image grading needs NumPy and Pillow (pip install numpy pillow).")
+        return
+    folder = input("Folder with card scans: ").strip()
+    if not os.path.isdir(folder):
+        print("❌ That folder doesn't exist.")
+        return
+    try:
+        surface = int(input("Surface score to use for every card (1-10): "))
+    except ValueError:
+        print("Oops! Please enter a whole number between 1 and 10.")
+        return
+    try:
+        start = time.perf_counter()
+        results = grade_folder(folder, surface)
+        print_timing_report(results, time.perf_counter() - start)
+    except Exception as e:
+        print(f"❌ Error grading scans: {e}")
+    print("---\n")
+
+def run_collection_analytics():
+    """Show ROI per set and how grades are spread, using the columnar snapshot of the collection."""
+    print("\n--- Collection Analytics ---")
+    try:
+        # Imported here so the rest of the CLI still works without NumPy installed
+        from pokeport.snapshot import get_snapshot, collection_roi, collection_grades
+    except ImportError:
+        print("❌ Analytics needs NumPy (pip install numpy).")
+        return
+    try:
+        snapshot = get_snapshot()
+        if len(snapshot) == 0:
+            print("No cards in your collection yet. Add some cards first!")
+        else:
+            roi = collection_roi(snapshot)
+            print(f"Collection ROI: {roi['total'] * 100:.1f}%")
+            print("ROI by set:")
+            for set_name, set_roi in sorted(roi["per_set"].items()):
+                print(f"  {set_name}: {set_roi * 100:.1f}%")
+            print("Cards per grade:")
+            for grade, count in collection_grades(snapshot).items():
+                if count:
+                    print(f"  {grade}: {count}")
+    except Exception as e:
+        print(f"❌ Error building analytics: {e}")
+    print("---\n")
+
 if __name__ == "__main__":
-    main_menu()
+    # Start pre-loading searches for cards we already own, so the first lookups are instant
+    warmer = start_cache_warmer()
+    try:
+        main_menu()
+    finally:
+        warmer.stop()
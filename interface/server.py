@@ -0,0 +1,475 @@
+"""
+server.py - A small local JSON web service for PokePort.
+
+Why this file exists:
+> The CLI can only be used by one person typing at a time. This server exposes the same features (the card collection, grading, ROI and the Pokemon TCG API search) as JSON over HTTP, so a web page, a script or the future Streamlit UI can use them too. It only uses Python's standard library: asyncio handles many connections at once, and the blocking database/API calls run in worker threads so they don't hold everyone else up.
+
+How to run it (from the project folder):
+    python -m interface.server --port 8765
+
+Endpoints (all return JSON):
+    GET    /cards?page=1&page_size=50       One page of the collection
+    GET    /cards/<id>                      One card
+    POST   /cards                           Add a card (JSON body with PokemonCard fields)
+    PUT    /cards/<id>                      Update a card
+    DELETE /cards/<id>                      Delete a card
+    GET    /cards/<id>/roi                  ROI for one card
+    GET    /summary                         Portfolio and per-set totals
+    GET    /grade?centering=9&corners=9&edges=8&surface=9
+    GET    /roi?purchase_price=10&market_value=15
+    GET    /search?name=Pikachu&set=&number=&rarity=&page=1&page_size=20
+
+Caching:
+- Collection endpoints send an ETag built from the collection version (it changes on every write).
+  Send it back in If-None-Match and you'll get an empty 304 reply if nothing changed.
+- Search results are kept in memory for a few minutes, and identical searches that arrive at the
+  same time share one API call.
+
+Next steps:
+- Put the Streamlit UI on top of this
+- Add authentication if it's ever used outside this computer
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import re
+import time
+from collections import OrderedDict
+from http import HTTPStatus
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from pokeport import storage
+from pokeport.api import get_card_details, search_cards_advanced, search_cards_by_name
+from pokeport.grading import estimate_psa_grade
+from pokeport.models import PokemonCard
+from pokeport.roi import calculate_roi
+
+DEFAULT_HOST = "127.0.0.1"  # Only reachable from this computer
+DEFAULT_PORT = 8765
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_PAGE = 1_000_000           # Keeps the row offset well inside SQLite's 64-bit integers
+MAX_QUANTITY = 1_000_000
+MAX_CARD_ID = 2 ** 63 - 1      # The largest INTEGER PRIMARY KEY SQLite can store
+SEARCH_CACHE_SIZE = 256        # How many different searches we remember
+SEARCH_CACHE_SECONDS = 300     # How long a search result stays fresh (same as api.py)
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+KEEP_ALIVE_SECONDS = 15        # Close idle connections after this long
+
+class HTTPError(Exception):
+    """Raised by a handler to send an error reply, e.g. HTTPError(404, "No card with id 3")."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class Request:
+    """The parts of an HTTP request the handlers need."""
+
+    def __init__(self, method: str, path: str, query: Dict[str, List[str]], headers: Dict[str, str], body: bytes):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+        self.params: Dict[str, str] = {}  # Filled in from the URL pattern, e.g. {"card_id": "3"}
+
+    def arg(self, name: str, default: str = "") -> str:
+        values = self.query.get(name)
+        return values[0].strip() if values else default
+
+    def number_arg(self, name: str, default: Optional[float] = None) -> float:
+        value = self.arg(name)
+        if not value:
+            if default is None:
+                raise HTTPError(400, f"Missing query parameter '{name}'.")
+            return default
+        try:
+            number = float(value)
+        except ValueError:
+            number = math.nan
+        if not math.isfinite(number):  # float() also accepts "nan" and "inf"
+            raise HTTPError(400, f"Query parameter '{name}' must be a number.")
+        return number
+
+    def json(self) -> dict:
+        try:
+            data = json.loads(self.body or b"{}")
+        except json.JSONDecodeError:
+            raise HTTPError(400, "Request body must be valid JSON.")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "Request body must be a JSON object.")
+        return data
+
+class Response:
+    """A reply: status code, body (already turned into JSON bytes) and extra headers."""
+
+    def __init__(self, status: int = 200, body: bytes = b"", headers: Optional[Dict[str, str]] = None):
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+def _to_json(data) -> bytes:
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+def json_response(data, status: int = 200, etag: Optional[str] = None) -> Response:
+    headers = {"ETag": etag} if etag else {}
+    return Response(status, _to_json(data), headers)
+
+def _not_modified(request: Request, etag: str) -> bool:
+    """True if the client already has this exact version (If-None-Match matches our ETag)."""
+    sent = request.headers.get("if-none-match", "")
+    return sent == "*" or etag in [tag.strip() for tag in sent.split(",")]
+
+def _page_args(request: Request, default_size: int = DEFAULT_PAGE_SIZE) -> Tuple[int, int]:
+    page = int(request.number_arg("page", 1))
+    page_size = int(request.number_arg("page_size", default_size))
+    if not 1 <= page <= MAX_PAGE or not 1 <= page_size <= MAX_PAGE_SIZE:
+        raise HTTPError(400, f"page must be between 1 and {MAX_PAGE} and page_size between 1 and {MAX_PAGE_SIZE}.")
+    return page, page_size
+
+class ResponseCache:
+    """
+    Remembers finished replies for a while (least recently used ones are dropped first).
+
+    If several requests ask for the same key while it's still being worked out, they all wait for
+    the first one instead of each calling the API.
+    """
+
+    def __init__(self, max_entries: int, max_age: float):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries: "OrderedDict[str, Tuple[float, Response]]" = OrderedDict()
+        self._in_flight: Dict[str, "asyncio.Future[Response]"] = {}
+
+    async def get_or_create(self, key: str, create: Callable[[], Awaitable[Response]]) -> Response:
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.max_age:
+            self._entries.move_to_end(key)
+            return entry[1]
+
+        if key in self._in_flight:
+            return await asyncio.shield(self._in_flight[key])
+
+        future: "asyncio.Future[Response]" = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            response = await create()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark it as seen so asyncio doesn't warn when nobody else was waiting
+            raise
+        finally:
+            del self._in_flight[key]
+        future.set_result(response)
+        # Only remember replies that say they can be cached
+        if response.status == 200 and "Cache-Control" in response.headers:
+            self._entries[key] = (time.monotonic(), response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return response
+
+_search_cache = ResponseCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_SECONDS)
+
+# --- Handlers ---
+# Each handler is async and returns a Response. Anything that touches the database or the network
+# runs in a worker thread (asyncio.to_thread) so other requests keep being served meanwhile.
+
+async def _collection_etag() -> str:
+    version = await asyncio.to_thread(storage.get_collection_version)
+    return f'"v{version}"'
+
+async def list_cards(request: Request) -> Response:
+    page, page_size = _page_args(request)
+    etag = await _collection_etag()
+    if _not_modified(request, etag):
+        return Response(304, headers={"ETag": etag})
+    cards, total = await asyncio.to_thread(storage.get_cards_page, (page - 1) * page_size, page_size)
+    return json_response({
+        "page": page,
+        "page_size": page_size,
+        "total": total,
+        "pages": (total + page_size - 1) // page_size,
+        "cards": [card.to_dict() for card in cards],
+    }, etag=etag)
+
+def _card_id(request: Request) -> int:
+    card_id = int(request.params["card_id"])
+    if card_id > MAX_CARD_ID:  # Too big to be in the database (and too big to look up)
+        raise HTTPError(404, f"No card with id {card_id}.")
+    return card_id
+
+async def _load_card(request: Request) -> PokemonCard:
+    card_id = _card_id(request)
+    card = await asyncio.to_thread(storage.get_card, card_id)
+    if card is None:
+        raise HTTPError(404, f"No card with id {card_id}.")
+    return card
+
+async def get_card(request: Request) -> Response:
+    etag = await _collection_etag()
+    if _not_modified(request, etag):
+        return Response(304, headers={"ETag": etag})
+    card = await _load_card(request)
+    return json_response(card.to_dict(), etag=etag)
+
+def _card_from_body(request: Request, card_id: Optional[int] = None) -> PokemonCard:
+    data = request.json()
+    data["id"] = card_id
+    if not all(isinstance(data.get(name), str) and data[name] for name in ("name", "set_name", "rarity")):
+        raise HTTPError(400, "name, set_name and rarity are required and must be text.")
+    if not isinstance(data.get("condition", ""), str):
+        raise HTTPError(400, "condition must be text.")
+    if not all(isinstance(data.get(name), (str, type(None))) for name in ("api_id", "image_url", "image_path")):
+        raise HTTPError(400, "api_id, image_url and image_path must be text or null.")
+    if any(isinstance(data.get(name), bool) for name in ("purchase_price", "market_value", "grading_score", "quantity")):
+        raise HTTPError(400, "purchase_price, market_value, grading_score and quantity must be numbers.")
+    try:
+        card = PokemonCard.from_dict(data)
+        card.purchase_price = float(card.purchase_price)
+        card.market_value = float(card.market_value)
+        card.grading_score = float(card.grading_score)
+        card.quantity = int(card.quantity)
+    except (TypeError, ValueError, OverflowError):
+        raise HTTPError(400, "purchase_price, market_value, grading_score and quantity must be numbers.")
+    numbers = (card.purchase_price, card.market_value, card.grading_score)
+    if not all(math.isfinite(number) and number >= 0 for number in numbers) or card.quantity < 0:
+        raise HTTPError(400, "purchase_price, market_value, grading_score and quantity must be 0 or more.")
+    if card.quantity > MAX_QUANTITY:
+        raise HTTPError(400, f"quantity can be at most {MAX_QUANTITY}.")
+    return card
+
+async def add_card(request: Request) -> Response:
+    card = _card_from_body(request)
+    # Writes go through the shared WriteQueue, so many clients adding at once get grouped into a few commits
+    card_id = await asyncio.wrap_future(storage.get_write_queue().add_card(card))
+    saved = await asyncio.to_thread(storage.get_card, card_id)
+    return json_response(saved.to_dict() if saved else {"id": card_id}, status=201)
+
+async def update_card(request: Request) -> Response:
+    await _load_card(request)  # 404 if it doesn't exist
+    card = _card_from_body(request, _card_id(request))
+    try:
+        await asyncio.wrap_future(storage.get_write_queue().update_card(card))
+    except ValueError:
+        # Deleted by another client between the check above and the write
+        raise HTTPError(404, f"No card with id {card.id}.")
+    saved = await asyncio.to_thread(storage.get_card, card.id)
+    return json_response(saved.to_dict() if saved else card.to_dict())
+
+async def delete_card(request: Request) -> Response:
+    card = await _load_card(request)
+    await asyncio.wrap_future(storage.get_write_queue().delete_card(card.id))
+    return json_response({"deleted": card.id})
+
+async def card_roi(request: Request) -> Response:
+    card = await _load_card(request)
+    return json_response({
+        "id": card.id,
+        "purchase_price": card.purchase_price,
+        "market_value": card.market_value,
+        "roi": calculate_roi(card.purchase_price or 0, card.market_value or 0),
+    })
+
+async def summary(request: Request) -> Response:
+    etag = await _collection_etag()
+    if _not_modified(request, etag):
+        return Response(304, headers={"ETag": etag})
+    portfolio = await asyncio.to_thread(storage.get_portfolio_summary)
+    sets = await asyncio.to_thread(storage.get_set_summaries)
+    portfolio["roi"] = calculate_roi(portfolio["total_cost"], portfolio["total_value"])
+    return json_response({"portfolio": portfolio, "sets": sets}, etag=etag)
+
+async def grade(request: Request) -> Response:
+    scores = {name: request.number_arg(name) for name in ("centering", "corners", "edges", "surface")}
+    if not all(1 <= score <= 10 for score in scores.values()):
+        raise HTTPError(400, "Each score must be between 1 and 10.")
+    grade_value, explanation = estimate_psa_grade(**scores)
+    return json_response({"grade": grade_value, "explanation": explanation, **scores})
+
+async def roi(request: Request) -> Response:
+    purchase_price = request.number_arg("purchase_price")
+    market_value = request.number_arg("market_value")
+    return json_response({
+        "purchase_price": purchase_price,
+        "market_value": market_value,
+        "roi": calculate_roi(purchase_price, market_value),
+    })
+
+async def search(request: Request) -> Response:
+    name = request.arg("name")
+    if not name:
+        raise HTTPError(400, "Missing query parameter 'name'.")
+    set_name, number, rarity = request.arg("set"), request.arg("number"), request.arg("rarity")
+    page, page_size = _page_args(request, default_size=20)
+    key = json.dumps([name.lower(), set_name.lower(), number, rarity.lower(), page, page_size])
+
+    async def run_search() -> Response:
+        if set_name or number or rarity:
+            cards = await asyncio.to_thread(search_cards_advanced, name, set_name, number, rarity)
+        else:
+            cards = await asyncio.to_thread(search_cards_by_name, name)
+        start = (page - 1) * page_size
+        body = _to_json({
+            "page": page,
+            "page_size": page_size,
+            "total": len(cards),
+            "pages": (len(cards) + page_size - 1) // page_size,
+            "cards": [get_card_details(card) for card in cards[start:start + page_size]],
+        })
+        # Search results don't depend on our collection, so the ETag comes from the reply itself
+        etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+        headers = {"ETag": etag}
+        # api.py returns an empty list when the request failed, so don't hold on to empty results
+        if cards:
+            headers["Cache-Control"] = f"max-age={SEARCH_CACHE_SECONDS}"
+        return Response(200, body, headers)
+
+    response = await _search_cache.get_or_create(key, run_search)
+    if _not_modified(request, response.headers["ETag"]):
+        return Response(304, headers={"ETag": response.headers["ETag"]})
+    return response
+
+# Method, URL pattern, handler. Named groups in the pattern end up in request.params.
+ROUTES = [
+    ("GET", r"/cards", list_cards),
+    ("POST", r"/cards", add_card),
+    ("GET", r"/cards/(?P<card_id>\d+)", get_card),
+    ("PUT", r"/cards/(?P<card_id>\d+)", update_card),
+    ("DELETE", r"/cards/(?P<card_id>\d+)", delete_card),
+    ("GET", r"/cards/(?P<card_id>\d+)/roi", card_roi),
+    ("GET", r"/summary", summary),
+    ("GET", r"/grade", grade),
+    ("GET", r"/roi", roi),
+    ("GET", r"/search", search),
+]
+_COMPILED_ROUTES = [(method, re.compile(pattern + r"/?"), handler) for method, pattern, handler in ROUTES]
+
+async def dispatch(request: Request) -> Response:
+    """Find the handler for a request and turn any error into a JSON error reply."""
+    path_matched = False
+    for method, pattern, handler in _COMPILED_ROUTES:
+        match = pattern.fullmatch(request.path)
+        if match is None:
+            continue
+        path_matched = True
+        if method != request.method:
+            continue
+        request.params = match.groupdict()
+        try:
+            return await handler(request)
+        except HTTPError as e:
+            return json_response({"error": e.message}, status=e.status)
+        except Exception as e:
+            print(f"❌ Error handling {request.method} {request.path}: {e}")
+            return json_response({"error": "Internal server error."}, status=500)
+    if path_matched:
+        return json_response({"error": "Method not allowed."}, status=405)
+    return json_response({"error": "Not found."}, status=404)
+
+# --- HTTP plumbing ---
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Request]:
+    """Read one HTTP/1.1 request. Returns None when the client closed the connection."""
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_SECONDS)
+    except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+        return None
+    except asyncio.LimitOverrunError:
+        raise HTTPError(431, "Request headers too large.")
+
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _version = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line.")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", "0") or 0)
+    except ValueError:
+        raise HTTPError(400, "Invalid Content-Length header.")
+    if length < 0:
+        raise HTTPError(400, "Invalid Content-Length header.")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, "Request body too large.")
+    try:
+        body = await reader.readexactly(length) if length else b""
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None  # Client closed the connection before sending the whole body
+
+    url = urlsplit(target)
+    return Request(method.upper(), url.path, parse_qs(url.query), headers, body)
+
+def _write_response(writer: asyncio.StreamWriter, response: Response, keep_alive: bool) -> None:
+    reason = HTTPStatus(response.status).phrase
+    headers = {
+        "Content-Type": "application/json",
+        "Content-Length": str(len(response.body)),
+        "Connection": "keep-alive" if keep_alive else "close",
+        **response.headers,
+    }
+    head = f"HTTP/1.1 {response.status} {reason}\r\n" + "".join(f"{k}: {v}\r\n" for k, v in headers.items()) + "\r\n"
+    writer.write(head.encode("latin-1") + response.body)
+
+async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Serve requests on one connection until the client closes it (HTTP keep-alive)."""
+    try:
+        while True:
+            try:
+                request = await _read_request(reader)
+            except HTTPError as e:
+                _write_response(writer, json_response({"error": e.message}, status=e.status), keep_alive=False)
+                break
+            if request is None:
+                break
+            response = await dispatch(request)
+            keep_alive = request.headers.get("connection", "").lower() != "close"
+            _write_response(writer, response, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass  # Client went away mid-reply
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+async def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> None:
+    """Start the server and run until it's stopped (Ctrl+C)."""
+    storage.init_db()
+    server = await asyncio.start_server(handle_connection, host, port, limit=MAX_HEADER_BYTES, backlog=1024)
+    print(f"🌐 PokePort server running on http://{host}:{port} (Ctrl+C to stop)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        # Commit anything still waiting in the write queue
+        storage.close_write_queue()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the PokePort JSON server.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("Server stopped.")
@@ -6,12 +6,12 @@ Why this file exists:
 
 Next steps:
 - Add more search filters (rarity, card number)
-- Cache results to avoid repeated API calls
-- Handle API rate limits gracefully
+- Handle API rate limit errors (HTTP 429) by backing off
 """
 
 import requests
 import json
+import threading
 import time
 from typing import List, Dict, Optional
 
@@ -21,22 +21,119 @@ API_KEY = "6ab60738-dc13-41ed-9aed-e24fedec7ea5"  # TODO: Move this to environme
 
 # Simple cache to avoid repeated API calls
 # In a real app, you might use Redis or a database for this
-_cache = {}
+_cache = {}  # key -> (data, time it expires)
 _cache_timeout = 300  # Cache results for 5 minutes
+# Searches warmed in the background (cache_warmer.py) are kept much longer: the warmer needs one
+# request per second, so with a few hundred cards the first results would expire before it finished
+PREFETCH_CACHE_TIMEOUT = 4 * 60 * 60
+_cache_stats = {"hits": 0, "misses": 0}  # How often searches were answered from the cache
+
+# Rate limiting: background work (like cache_warmer.py) waits at least this long between requests,
+# and always lets searches the user is waiting for go first
+BACKGROUND_REQUEST_INTERVAL = 1.0
+_rate_lock = threading.Lock()
+_next_background_request = 0.0
+_foreground_requests = 0  # Searches the user is waiting for right now
 
 def _get_cached_data(key: str) -> Optional[List[Dict]]:
     """Get data from cache if it's still valid."""
-    if key in _cache:
-        data, timestamp = _cache[key]
-        if time.time() - timestamp < _cache_timeout:
+    entry = _cache.get(key)
+    if entry is not None:
+        data, expires = entry
+        if time.time() < expires:
             return data
         else:
-            del _cache[key]  # Remove expired cache entry
+            _cache.pop(key, None)  # Remove expired cache entry (another thread may have beaten us to it)
     return None
 
-def _set_cached_data(key: str, data: List[Dict]) -> None:
-    """Store data in cache with current timestamp."""
-    _cache[key] = (data, time.time())
+def _set_cached_data(key: str, data: List[Dict], timeout: Optional[float] = None) -> None:
+    """Store data in cache for `timeout` seconds (defaults to _cache_timeout)."""
+    _cache[key] = (data, time.time() + (_cache_timeout if timeout is None else timeout))
+
+def _lookup_cache(key: str) -> Optional[List[Dict]]:
+    """Cache lookup for user searches, keeping count of hits and misses."""
+    data = _get_cached_data(key)
+    _cache_stats["hits" if data else "misses"] += 1
+    return data
+
+def get_cache_stats() -> Dict[str, float]:
+    """Return how many searches were cache hits/misses, and the hit rate (0-1)."""
+    total = _cache_stats["hits"] + _cache_stats["misses"]
+    return {**_cache_stats, "hit_rate": _cache_stats["hits"] / total if total else 0.0}
+
+def _name_cache_key(card_name: str) -> str:
+    return f"search_{card_name.lower()}"
+
+def _advanced_cache_key(card_name: str, set_name: str = "", card_number: str = "", rarity: str = "") -> str:
+    return f"advanced_{card_name.lower()}_{set_name.lower()}_{card_number}_{rarity.lower()}"
+
+def _advanced_query(card_name: str, set_name: str, card_number: str, rarity: str) -> str:
+    """Build the query string for an advanced search using correct API syntax."""
+    query_parts = [f"name:\"{card_name}\""]
+    if set_name:
+        # Handle promo card searches better
+        if "promo" in set_name.lower():
+            # For promo searches, we'll do a broader search and filter later
+            pass  # Don't add set filter for promo searches
+        else:
+            query_parts.append(f"set.name:\"{set_name}\"")
+    if card_number:
+        query_parts.append(f"number:\"{card_number}\"")
+    if rarity:
+        query_parts.append(f"rarity:\"{rarity}\"")
+    return " AND ".join(query_parts)
+
+def _filter_promo_results(cards: List[Dict], set_name: str) -> List[Dict]:
+    """If searching for promos, keep only the promo cards."""
+    if set_name and "promo" in set_name.lower():
+        promo_cards = []
+        for card in cards:
+            card_set_name = card.get("set", {}).get("name", "").lower()
+            if "promo" in card_set_name or "black star" in card_set_name:
+                promo_cards.append(card)
+        return promo_cards
+    return cards
+
+def _request_cards(params: Dict, background: bool = False, cancel: Optional[threading.Event] = None) -> Optional[List[Dict]]:
+    """
+    Make the actual API request and return the list of cards.
+
+    Errors are raised for the caller to handle. Background requests wait for the rate limit and
+    for any user searches to finish first; they return None if `cancel` is set while waiting.
+    """
+    global _foreground_requests, _next_background_request
+    if background:
+        while True:
+            with _rate_lock:
+                wait = _next_background_request - time.monotonic()
+                if _foreground_requests == 0 and wait <= 0:
+                    _next_background_request = time.monotonic() + BACKGROUND_REQUEST_INTERVAL
+                    break
+            if cancel is not None and cancel.wait(max(wait, 0.05)):
+                return None
+            elif cancel is None:
+                time.sleep(max(wait, 0.05))
+    else:
+        with _rate_lock:
+            _foreground_requests += 1
+
+    try:
+        # Set up the API request headers
+        headers = {
+            "X-Api-Key": API_KEY,
+            "Content-Type": "application/json"
+        }
+        response = requests.get(f"{BASE_URL}/cards", headers=headers, params=params, timeout=10)
+        response.raise_for_status()  # Raise an exception for bad status codes
+        # Parse the JSON response
+        data = response.json()
+        return data.get("data", [])
+    finally:
+        if not background:
+            with _rate_lock:
+                _foreground_requests -= 1
+                # Give the API a breather before background work starts again
+                _next_background_request = time.monotonic() + BACKGROUND_REQUEST_INTERVAL
 
 def search_cards_by_name(card_name: str) -> List[Dict]:
     """
@@ -52,19 +149,13 @@ def search_cards_by_name(card_name: str) -> List[Dict]:
         List[Dict]: List of card data from the API
     """
     # Check cache first
-    cache_key = f"search_{card_name.lower()}"
-    cached_data = _get_cached_data(cache_key)
+    cache_key = _name_cache_key(card_name)
+    cached_data = _lookup_cache(cache_key)
     if cached_data:
         print("📋 Using cached results...")
         return cached_data
     
     try:
-        # Set up the API request headers
-        headers = {
-            "X-Api-Key": API_KEY,
-            "Content-Type": "application/json"
-        }
-        
         # Build the search query
         params = {
             "q": f"name:{card_name}",
@@ -73,12 +164,7 @@ def search_cards_by_name(card_name: str) -> List[Dict]:
         
         print(f"🌐 Making API request for '{card_name}'...")
         # Make the API request
-        response = requests.get(f"{BASE_URL}/cards", headers=headers, params=params, timeout=10)
-        response.raise_for_status()  # Raise an exception for bad status codes
-        
-        # Parse the JSON response
-        data = response.json()
-        cards = data.get("data", [])
+        cards = _request_cards(params)
         
         # Cache the results
         _set_cached_data(cache_key, cards)
@@ -111,54 +197,24 @@ def search_cards_advanced(card_name: str, set_name: str = "", card_number: str =
         List[Dict]: Filtered list of card data
     """
     # Build cache key based on all search parameters
-    cache_key = f"advanced_{card_name.lower()}_{set_name.lower()}_{card_number}_{rarity.lower()}"
-    cached_data = _get_cached_data(cache_key)
+    cache_key = _advanced_cache_key(card_name, set_name, card_number, rarity)
+    cached_data = _lookup_cache(cache_key)
     if cached_data:
         print("📋 Using cached results...")
         return cached_data
     
     try:
-        headers = {
-            "X-Api-Key": API_KEY,
-            "Content-Type": "application/json"
-        }
-        
         # Build a more specific search query using correct API syntax
-        query_parts = [f"name:\"{card_name}\""]
-        if set_name:
-            # Handle promo card searches better
-            if "promo" in set_name.lower():
-                # For promo searches, we'll do a broader search and filter later
-                pass  # Don't add set filter for promo searches
-            else:
-                query_parts.append(f"set.name:\"{set_name}\"")
-        if card_number:
-            query_parts.append(f"number:\"{card_number}\"")
-        if rarity:
-            query_parts.append(f"rarity:\"{rarity}\"")
-        
-        query = " AND ".join(query_parts)
-        
         params = {
-            "q": query,
+            "q": _advanced_query(card_name, set_name, card_number, rarity),
             "pageSize": 100  # Increased for promo searches
         }
         
         print(f"🌐 Making advanced API request...")
-        response = requests.get(f"{BASE_URL}/cards", headers=headers, params=params, timeout=10)
-        response.raise_for_status()
-        
-        data = response.json()
-        cards = data.get("data", [])
+        cards = _request_cards(params)
         
         # If searching for promos, filter the results
-        if set_name and "promo" in set_name.lower():
-            promo_cards = []
-            for card in cards:
-                card_set_name = card.get("set", {}).get("name", "").lower()
-                if "promo" in card_set_name or "black star" in card_set_name:
-                    promo_cards.append(card)
-            cards = promo_cards
+        cards = _filter_promo_results(cards, set_name)
         
         # Cache the results
         _set_cached_data(cache_key, cards)
@@ -319,6 +375,7 @@ def get_card_details(card: Dict) -> Dict:
         Dict: Simplified card details
     """
     return {
+        "api_id": card.get("id", ""),
         "name": card.get("name", ""),
         "set_name": card.get("set", {}).get("name", ""),
         "rarity": card.get("rarity", ""),
@@ -327,6 +384,44 @@ def get_card_details(card: Dict) -> Dict:
         "total_cards": card.get("set", {}).get("total", "")
     }
 
+def prefetch_search(card_name: str, set_name: str = "", cancel: Optional[threading.Event] = None) -> bool:
+    """
+    Quietly fill the cache for a search the user is likely to make, without printing anything.
+
+    With only a name this warms search_cards_by_name; with a set name too it warms
+    search_cards_advanced(card_name, set_name). Already cached searches are skipped. Runs at
+    background priority: it waits for the rate limit and for any searches the user is making.
+    Results are cached for PREFETCH_CACHE_TIMEOUT, so they last the whole session.
+
+    Args:
+        card_name (str): The name of the Pokemon card
+        set_name (str): Optional set name
+        cancel (Optional[threading.Event]): Stop waiting and give up if this gets set
+
+    Returns:
+        bool: True if a request was made and cached
+    """
+    if set_name:
+        cache_key = _advanced_cache_key(card_name, set_name)
+        params = {"q": _advanced_query(card_name, set_name, "", ""), "pageSize": 100}
+    else:
+        cache_key = _name_cache_key(card_name)
+        params = {"q": f"name:{card_name}", "pageSize": 250}
+    if _get_cached_data(cache_key):
+        return False
+    try:
+        cards = _request_cards(params, background=True, cancel=cancel)
+    except (requests.exceptions.RequestException, json.JSONDecodeError):
+        return False  # Not worth bothering the user about; the real search will try again
+    if cards is None:
+        return False  # Cancelled while waiting
+    if set_name:
+        cards = _filter_promo_results(cards, set_name)
+    # Don't overwrite a result a user search stored while we were waiting
+    if not _get_cached_data(cache_key):
+        _set_cached_data(cache_key, cards, PREFETCH_CACHE_TIMEOUT)
+    return True
+
 def clear_cache() -> None:
     """Clear the API cache. Useful for testing or when cache gets too large."""
     global _cache
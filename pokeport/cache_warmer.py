@@ -0,0 +1,74 @@
+"""
+cache_warmer.py - Pre-loads API searches for cards we already own, in the background.
+
+Why this file exists:
+> Every time the CLI starts, the API cache in api.py is empty, so the first search for a card we already own always waits on the network. Most searches are for cards (or other versions of cards) already in the collection, so this module reads the distinct name/set pairs from the database when the CLI starts and quietly runs those searches in a background thread. By the time the user types a name, the answer is usually already cached.
+
+How it stays out of the way:
+- It runs in a daemon thread and uses api.prefetch_search, which never prints anything.
+- Requests wait for api.py's background rate limit, and always let searches the user is waiting for go first.
+- stop() cancels it straight away, even in the middle of waiting, so exiting the CLI never hangs.
+
+Next steps:
+- Remember which searches are most common and warm those first
+"""
+
+import threading
+from typing import List, Optional, Tuple
+
+from pokeport.api import prefetch_search
+from pokeport.storage import get_owned_name_set_pairs
+
+class CacheWarmer:
+    """Background thread that fills the API search cache for cards in the collection."""
+
+    def __init__(self, include_sets: bool = True):
+        self.include_sets = include_sets
+        self.fetched = 0  # How many searches were actually fetched (already cached ones are skipped)
+        self._cancel = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _searches(self) -> List[Tuple[str, str]]:
+        """
+        The searches to warm, most useful first: one plain name search per card name (that's what
+        the CLI runs when no filters are given), then name + set searches.
+        """
+        pairs = get_owned_name_set_pairs()
+        searches = [(name, "") for name in dict.fromkeys(name for name, _ in pairs)]
+        if self.include_sets:
+            # Promo set searches are answered from the plain name search, so they don't need their own
+            searches += [(name, set_name) for name, set_name in pairs if set_name and "promo" not in set_name.lower()]
+        return searches
+
+    def _run(self) -> None:
+        try:
+            searches = self._searches()
+        except Exception:
+            return  # No database yet (or it's busy); warming is only a nice-to-have
+        for name, set_name in searches:
+            if self._cancel.is_set():
+                return
+            if prefetch_search(name, set_name, cancel=self._cancel):
+                self.fetched += 1
+
+    def start(self) -> "CacheWarmer":
+        """Start warming in the background. Returns self so it can be chained."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="pokeport-cache-warmer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """Cancel any remaining work and wait (briefly) for the thread to finish."""
+        self._cancel.set()
+        if self._thread is not None:
+            # A request already on the wire can't be interrupted; the thread is a daemon,
+            # so if it takes longer than `timeout` it simply won't keep the program alive
+            self._thread.join(timeout)
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+def start_cache_warmer(include_sets: bool = True) -> CacheWarmer:
+    """Create a CacheWarmer and start it. Call .stop() on the result before exiting."""
+    return CacheWarmer(include_sets).start()
@@ -38,6 +38,26 @@ def estimate_psa_grade(centering, corners, edges, surface):
     )
     return grade, explanation
 
+def grade_distribution(grades, quantities=None):
+    """
+    Count how many cards fall into each whole grade from 1 to 10.
+
+    Grades are rounded to the nearest whole number (e.g. 8.75 counts as a 9). Cards without a grade
+    (NaN/None, or 0 which is the PokemonCard default) are skipped. If quantities are given, each card counts that many times.
+    Needs NumPy (pip install numpy).
+
+    Returns:
+        counts (dict): Grade (1-10) -> number of cards
+    """
+    import numpy as np  # Only needed here, so the rest of the module works without NumPy
+
+    grades = np.asarray(grades, dtype=np.float64)
+    weights = np.ones_like(grades) if quantities is None else np.asarray(quantities, dtype=np.float64)
+    graded = ~np.isnan(grades) & (grades > 0)
+    buckets = np.clip(np.rint(grades[graded]), 1, 10).astype(np.int64)
+    counts = np.bincount(buckets, weights=weights[graded], minlength=11)
+    return {grade: int(counts[grade]) for grade in range(1, 11)}
+
 # Example usage (for testing/learning):
 if __name__ == "__main__":
     # Example: all categories are near mint
@@ -0,0 +1,332 @@
+"""
+image_cache.py - Downloads card images once and keeps them on disk.
+
+Why this file exists:
+> The API only gives us an image URL for each card, so anything that wants to show a card has to download the picture again every time. This module fetches images (several at once), stores them by the SHA-256 hash of their contents so the same picture is never saved twice, and throws away the least recently used files when the cache gets too big. Thumbnails are made once and then reused.
+
+Next steps:
+- Show the cached thumbnails in the Streamlit UI once it exists
+- Maybe let the user pick the cache size from a settings file
+"""
+
+import atexit
+import glob
+import hashlib
+import json
+import mmap
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+import requests
+
+# Cache configuration
+CACHE_DIR = "image_cache"
+MAX_CACHE_BYTES = 200 * 1024 * 1024  # Keep at most ~200 MB of full-size images
+THUMBNAIL_SIZE = (123, 172)  # Roughly the aspect ratio of a real card
+MAX_WORKERS = 8  # How many images we download at the same time
+INDEX_SAVE_INTERVAL = 30  # Seconds between saves of "last used" times after cache hits
+
+# The index remembers which URL maps to which file, how big it is and when it was last used.
+# It is shared between download threads, so every access goes through _index_lock.
+_index: Dict[str, Dict] = {}
+_index_loaded = False
+_index_dirty = False  # True when last_used times changed since the index was saved
+_index_saved_at = 0.0
+_index_lock = threading.Lock()
+
+def _index_path() -> str:
+    return os.path.join(CACHE_DIR, "index.json")
+
+def _object_path(digest: str) -> str:
+    """Content-addressed path: the first two hex characters become a sub-folder so no folder gets huge."""
+    return os.path.join(CACHE_DIR, "objects", digest[:2], digest)
+
+def _thumbnail_path(digest: str, size: Tuple[int, int]) -> str:
+    return os.path.join(CACHE_DIR, "thumbs", f"{digest}_{size[0]}x{size[1]}.png")
+
+def _thumbnail_sizes() -> Dict[str, int]:
+    """Bytes used by thumbnails (of every size) for each digest."""
+    sizes: Dict[str, int] = {}
+    try:
+        with os.scandir(os.path.join(CACHE_DIR, "thumbs")) as entries:
+            for entry in entries:
+                if entry.name.endswith(".png") and "_" in entry.name:
+                    digest = entry.name.split("_", 1)[0]
+                    sizes[digest] = sizes.get(digest, 0) + entry.stat().st_size
+    except FileNotFoundError:
+        pass
+    return sizes
+
+def _remove_files(digest: str) -> None:
+    """Delete an image and all of its thumbnails."""
+    thumbnails = glob.glob(os.path.join(CACHE_DIR, "thumbs", glob.escape(digest) + "_*"))
+    for path in [_object_path(digest)] + thumbnails:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def _load_index() -> None:
+    """Load the index from disk the first time we need it. Caller must hold _index_lock."""
+    global _index_loaded
+    if _index_loaded:
+        return
+    try:
+        with open(_index_path(), "r", encoding="utf-8") as index_file:
+            _index.update(json.load(index_file))
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass  # Start with an empty cache
+    _index_loaded = True
+
+def _save_index() -> None:
+    """Write the index back to disk. Caller must hold _index_lock."""
+    global _index_dirty, _index_saved_at
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    temp_path = _index_path() + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as index_file:
+        json.dump(_index, index_file)
+    os.replace(temp_path, _index_path())  # Atomic swap so a crash never leaves half an index
+    _index_dirty = False
+    _index_saved_at = time.time()
+
+@atexit.register
+def _flush_index() -> None:
+    """Save "last used" times that haven't been written yet, so LRU order survives between sessions."""
+    with _index_lock:
+        if _index_dirty:
+            try:
+                _save_index()
+            except OSError:
+                pass  # Losing recency is better than crashing on exit
+
+def _evict_if_needed() -> None:
+    """
+    Remove least recently used images until the cache (images plus their thumbnails) fits in
+    MAX_CACHE_BYTES. Caller must hold _index_lock.
+    """
+    # Several URLs can point at the same file, so count each digest once
+    sizes = {entry["digest"]: entry["size"] for entry in _index.values()}
+    for digest, thumbnail_bytes in _thumbnail_sizes().items():
+        if digest in sizes:
+            sizes[digest] += thumbnail_bytes
+    total = sum(sizes.values())
+    if total <= MAX_CACHE_BYTES:
+        return
+
+    for url, entry in sorted(_index.items(), key=lambda item: item[1]["last_used"]):
+        if total <= MAX_CACHE_BYTES:
+            break
+        digest = entry["digest"]
+        del _index[url]
+        # Only delete the file when no other URL still uses it
+        if any(other["digest"] == digest for other in _index.values()):
+            continue
+        total -= sizes[digest]
+        _remove_files(digest)
+
+def _lookup(url: str) -> Optional[str]:
+    """Return the cached file for a URL (and mark it as recently used), or None."""
+    global _index_dirty
+    with _index_lock:
+        _load_index()
+        entry = _index.get(url)
+        if entry is None:
+            return None
+        path = _object_path(entry["digest"])
+        if not os.path.exists(path):
+            del _index[url]  # File was removed behind our back
+            return None
+        entry["last_used"] = time.time()
+        _index_dirty = True
+        # Save now and then (and at exit) rather than on every hit
+        if entry["last_used"] - _index_saved_at >= INDEX_SAVE_INTERVAL:
+            _save_index()
+        return path
+
+def _download(url: str) -> Optional[str]:
+    """Download one image and store it under its content hash. Returns the local path or None."""
+    try:
+        response = requests.get(url, timeout=10)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Image download failed for {url}: {e}")
+        return None
+
+    data = response.content
+    digest = hashlib.sha256(data).hexdigest()
+    path = _object_path(digest)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as image_file:
+            image_file.write(data)
+        os.replace(temp_path, path)
+
+    with _index_lock:
+        _load_index()
+        _index[url] = {"digest": digest, "size": len(data), "last_used": time.time()}
+        _evict_if_needed()
+        _save_index()
+        # Eviction could in theory remove the file we just added if it is bigger than the whole cache
+        return path if url in _index else None
+
+def get_image_path(url: str) -> Optional[str]:
+    """
+    Get the local path of a card image, downloading it if it isn't cached yet.
+
+    Args:
+        url (str): The image URL (e.g. PokemonCard.image_url)
+
+    Returns:
+        Optional[str]: Path to the cached image file, or None if it couldn't be downloaded
+    """
+    if not url:
+        return None
+    return _lookup(url) or _download(url)
+
+def fetch_images(urls: Iterable[str], max_workers: int = MAX_WORKERS) -> Dict[str, Optional[str]]:
+    """
+    Download many images at the same time.
+
+    Images that are already cached are not downloaded again.
+
+    Args:
+        urls (Iterable[str]): Image URLs to fetch
+        max_workers (int): How many downloads to run in parallel
+
+    Returns:
+        Dict[str, Optional[str]]: Maps each URL to its local path (None if the download failed)
+    """
+    unique_urls = list(dict.fromkeys(url for url in urls if url))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        paths = dict(zip(unique_urls, executor.map(get_image_path, unique_urls)))
+    # A later download in the same batch can evict an image an earlier one returned, so check again
+    with _index_lock:
+        return {
+            url: path if path is not None and url in _index and os.path.exists(path) else None
+            for url, path in paths.items()
+        }
+
+@contextmanager
+def map_image(path: str) -> Iterator[memoryview]:
+    """
+    Read a cached image through a memory map, without copying it.
+
+    The operating system pages the file in for us instead of copying it through Python's file buffers,
+    which is cheaper when the same images are shown over and over. The view is only valid inside the
+    with block, so copy anything you need to keep (e.g. bytes(view)).
+
+    Args:
+        path (str): Path returned by get_image_path or get_thumbnail_path
+
+    Yields:
+        memoryview: Read-only view of the raw image file contents
+
+    Example:
+        with map_image(path) as data:
+            response.write(data)
+    """
+    with open(path, "rb") as image_file:
+        if os.fstat(image_file.fileno()).st_size == 0:
+            yield memoryview(b"")  # mmap can't map an empty file
+            return
+        with mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                yield view
+            finally:
+                view.release()  # The map can only be closed once no view points into it
+
+def get_thumbnail_path(url: str, size: Tuple[int, int] = THUMBNAIL_SIZE) -> Optional[str]:
+    """
+    Get a small version of a card image, creating it the first time it is asked for.
+
+    Needs Pillow (pip install pillow). Without it, this just returns None.
+
+    Args:
+        url (str): The image URL
+        size (Tuple[int, int]): Maximum width and height of the thumbnail
+
+    Returns:
+        Optional[str]: Path to the thumbnail PNG, or None if it couldn't be made
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        print("❌ Pillow is not installed, so thumbnails can't be created.")
+        return None
+
+    image_path = get_image_path(url)
+    if image_path is None:
+        return None
+
+    digest = os.path.basename(image_path)
+    thumb_path = _thumbnail_path(digest, size)
+    if os.path.exists(thumb_path):
+        return thumb_path  # Already made, no work to do
+
+    os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+    with Image.open(image_path) as image:
+        image.thumbnail(size)
+        temp_path = f"{thumb_path}.{threading.get_ident()}.tmp"
+        image.save(temp_path, format="PNG")
+    os.replace(temp_path, thumb_path)
+
+    # Thumbnails count towards the cache size too
+    with _index_lock:
+        _evict_if_needed()
+        _save_index()
+    return thumb_path if os.path.exists(thumb_path) else None
+
+def prefetch_collection() -> int:
+    """
+    Warm the cache with the image of every card in the collection.
+
+    The local path of each image is saved back to the database so other parts of the app can use it.
+
+    Returns:
+        int: How many card images are now cached
+    """
+    # Imported here so the cache can be used without touching the database
+    from pokeport.storage import get_all_cards, update_image_path
+
+    cards = [card for card in get_all_cards() if card.image_url]
+    if not cards:
+        print("No card images to download.")
+        return 0
+
+    print(f"🌐 Downloading images for {len(cards)} cards...")
+    paths = fetch_images(card.image_url for card in cards)
+
+    cached = 0
+    for card in cards:
+        path = paths.get(card.image_url)
+        if path is None:
+            # Don't leave the card pointing at a file that was evicted (or never arrived)
+            if card.image_path and not os.path.exists(card.image_path) and card.id is not None:
+                update_image_path(card.id, None)
+            continue
+        cached += 1
+        if card.image_path != path and card.id is not None:
+            update_image_path(card.id, path)
+    print(f"✅ {cached} of {len(cards)} card images cached.")
+    return cached
+
+def clear_image_cache() -> None:
+    """Forget every cached image. Files on disk are removed too."""
+    with _index_lock:
+        _load_index()
+        digests = {entry["digest"] for entry in _index.values()}
+        for digest in digests:
+            _remove_files(digest)
+        _index.clear()
+        _save_index()
+    print("🗑️ Image cache cleared.")
+
+# Example usage: warm the cache for the whole collection
+if __name__ == "__main__":
+    prefetch_collection()
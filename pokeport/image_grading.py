@@ -0,0 +1,348 @@
+"""
+image_grading.py - Measures centering, edges and corners from a scanned card image.
+
+Why this file exists:
+> Typing in four grading scores by hand is fine for one card, but it's slow when grading a whole binder. This module looks at a scan of the front of a card, finds the outer edge of the card and the inner edge of its yellow (or silver) border, and works out the centering ratios from those. It also gives rough scores for edge and corner wear by looking for white spots where the border colour should be. Those scores are then passed to estimate_psa_grade, so the grade is worked out the same way as the manual entry.
+
+How it works:
+- The image is loaded as a NumPy array and every step works on whole rows/columns at once (no Python loops over pixels), which keeps it fast on big scans.
+- Surface can't really be judged from a flat scan, so it's still passed in by the user.
+
+Next steps:
+- Try it on more scans (different scanners, sleeved cards) and tune the thresholds
+- Look at the back of the card too (PSA checks both sides)
+
+Needs NumPy and Pillow: pip install numpy pillow
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from pokeport.grading import estimate_psa_grade
+
+# File types we try to grade when given a folder
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+
+# How different (0-255 grey levels) a pixel has to be to count as "not the same colour"
+BACKGROUND_THRESHOLD = 40
+BORDER_THRESHOLD = 35
+# How much brighter than the border colour a pixel has to be to count as whitening
+WHITENING_THRESHOLD = 45
+# Pokemon cards are 63 mm wide with corners rounded to about 3 mm
+CORNER_RADIUS_RATIO = 3 / 63
+# A card border is never wider than this share of the card (they're about 5%, so this leaves room for bad centering)
+MAX_BORDER_SHARE = 0.15
+
+# Worst side of the centering ratio (e.g. 60 for 60/40) -> centering score.
+# Based on the PSA guide: 55/45 or better is needed for a 10, 60/40 for a 9, and so on.
+CENTERING_LIMITS = [(55, 10), (60, 9), (65, 8), (70, 7), (75, 6), (80, 5), (85, 4), (90, 3)]
+
+def load_grayscale(path: str) -> np.ndarray:
+    """Load an image file as a 2D array of grey levels (0-255)."""
+    with Image.open(path) as image:
+        return np.asarray(image.convert("L"), dtype=np.float32)
+
+def scan_background(gray: np.ndarray) -> float:
+    """The scanner background colour: the median of small patches in the four corners of the image."""
+    height, width = gray.shape
+    patch = max(2, min(height, width) // 50)
+    corners = np.concatenate([
+        gray[:patch, :patch].ravel(), gray[:patch, -patch:].ravel(),
+        gray[-patch:, :patch].ravel(), gray[-patch:, -patch:].ravel(),
+    ])
+    return float(np.median(corners))
+
+def _looks_cropped(gray: np.ndarray, bounds: Tuple[int, int, int, int], background: float) -> bool:
+    """
+    True if the box find_card_bounds found is really the artwork of a scan that was already cropped
+    to the card (the "background" taken from the image corners was then the card's own border).
+
+    Two things give it away: the frame around the box is as wide as a card border could be (no more than
+    MAX_BORDER_SHARE of the image, and no worse than 90/10 centering), and the box has square corners
+    where a whole card would have rounded ones showing the background.
+    """
+    height, width = gray.shape
+    top, bottom, left, right = bounds
+    margins_x, margins_y = (left, width - right), (top, height - bottom)
+    for (first, second), size in ((margins_x, width), (margins_y, height)):
+        if min(first, second) == 0 or max(first, second) > MAX_BORDER_SHARE * size:
+            return False
+        if 100.0 * max(first, second) / (first + second) > CENTERING_LIMITS[-1][0]:
+            return False
+
+    # Just inside a rounded corner, a whole card shows the background
+    patch = max(1, int(0.25 * CORNER_RADIUS_RATIO * (right - left)))
+    box_corners = [
+        gray[top:top + patch, left:left + patch], gray[top:top + patch, right - patch:right],
+        gray[bottom - patch:bottom, left:left + patch], gray[bottom - patch:bottom, right - patch:right],
+    ]
+    rounded = sum(abs(float(np.median(corner)) - background) <= BACKGROUND_THRESHOLD for corner in box_corners)
+    return rounded <= 1
+
+def find_card_bounds(gray: np.ndarray) -> Tuple[int, int, int, int]:
+    """
+    Find where the card sits inside the scan.
+
+    The scanner background colour is taken from the four corners of the image. Any row or column
+    where most pixels are different from that colour is part of the card. If the scan turns out to be
+    cropped to the card already (see _looks_cropped), the whole image is the card.
+
+    Args:
+        gray (np.ndarray): Grayscale image
+
+    Returns:
+        Tuple[int, int, int, int]: (top, bottom, left, right) pixel positions, bottom/right exclusive
+    """
+    height, width = gray.shape
+    background = scan_background(gray)
+
+    is_card = np.abs(gray - background) > BACKGROUND_THRESHOLD
+    rows = np.flatnonzero(is_card.mean(axis=1) > 0.5)
+    cols = np.flatnonzero(is_card.mean(axis=0) > 0.5)
+    if rows.size == 0 or cols.size == 0:
+        # Nothing stands out from the background, so assume the scan is already cropped to the card
+        return 0, height, 0, width
+    bounds = int(rows[0]), int(rows[-1]) + 1, int(cols[0]), int(cols[-1]) + 1
+    if _looks_cropped(gray, bounds, background):
+        return 0, height, 0, width
+    return bounds
+
+def _border_width(profile: np.ndarray, border_colour: float) -> int:
+    """
+    How many pixels from the start of a 1D brightness profile still look like the border.
+    Returns the full length if the border colour never changes.
+    """
+    changed = np.abs(profile - border_colour) > BORDER_THRESHOLD
+    if not changed.any():
+        return int(profile.size)
+    return int(np.argmax(changed))
+
+def measure_borders(card: np.ndarray) -> Dict[str, int]:
+    """
+    Measure the width of the printed border on each side of a card.
+
+    Each side is turned into a single brightness profile by taking the median across the middle
+    half of the card (so the corners and a stray scratch don't throw it off). The border ends where
+    that profile stops matching the border colour.
+
+    Args:
+        card (np.ndarray): Grayscale image cropped to the card
+
+    Returns:
+        Dict[str, int]: Border widths in pixels for "left", "right", "top" and "bottom"
+    """
+    height, width = card.shape
+    row_band = slice(height // 4, 3 * height // 4)
+    col_band = slice(width // 4, 3 * width // 4)
+    # Only search the outer third of the card so we don't wander into the artwork box on the other side
+    max_depth_x = max(1, width // 3)
+    max_depth_y = max(1, height // 3)
+
+    left = np.median(card[row_band, :max_depth_x], axis=0)
+    right = np.median(card[row_band, -max_depth_x:], axis=0)[::-1]
+    top = np.median(card[:max_depth_y, col_band], axis=1)
+    bottom = np.median(card[-max_depth_y:, col_band], axis=1)[::-1]
+
+    # The border colour is what the outermost few pixels of all four sides have in common
+    edge_depth = max(1, min(width, height) // 100)
+    border_colour = float(np.median(np.concatenate([
+        left[:edge_depth], right[:edge_depth], top[:edge_depth], bottom[:edge_depth],
+    ])))
+
+    return {
+        "left": _border_width(left, border_colour),
+        "right": _border_width(right, border_colour),
+        "top": _border_width(top, border_colour),
+        "bottom": _border_width(bottom, border_colour),
+    }
+
+def centering_ratio(first: int, second: int) -> Tuple[float, float]:
+    """
+    Turn two opposite border widths into a PSA-style ratio, e.g. (55.0, 45.0).
+    Returns (50.0, 50.0) if neither border could be measured.
+    """
+    total = first + second
+    if total == 0:
+        return 50.0, 50.0
+    first_pct = 100.0 * first / total
+    return first_pct, 100.0 - first_pct
+
+def centering_score(left_right: Tuple[float, float], top_bottom: Tuple[float, float]) -> int:
+    """Score centering from 1-10 using the worse of the two ratios."""
+    worst = max(max(left_right), max(top_bottom))
+    for limit, score in CENTERING_LIMITS:
+        if worst <= limit:
+            return score
+    return 2
+
+def _wear_score(pixels: np.ndarray, border_colour: float) -> float:
+    """Score 1-10 from the share of pixels that are much brighter than the border (whitening)."""
+    if pixels.size == 0:
+        return 10.0
+    whitening = float(np.mean(pixels - border_colour > WHITENING_THRESHOLD))
+    # A few percent of white pixels is already very visible wear, so scale it up
+    return float(np.clip(10.0 - whitening * 40.0, 1.0, 10.0))
+
+def _rounded_corner_mask(size: int, radius: float) -> np.ndarray:
+    """
+    For a size x size square in the top-left corner of a card: True for pixels inside the card's
+    rounded outline, False for the bit outside it (that's scanner background, not card).
+    A pixel of slack keeps the anti-aliased edge of the outline out too.
+    """
+    centre = radius - 0.5
+    y, x = np.ogrid[:size, :size]
+    outside = (y < centre) & (x < centre) & ((centre - y) ** 2 + (centre - x) ** 2 > (radius - 1.5) ** 2)
+    return ~outside
+
+def measure_wear(card: np.ndarray) -> Tuple[float, float]:
+    """
+    Give rough edge and corner wear scores (1-10) for a card.
+
+    Edges: a thin strip along all four sides, leaving out the corners.
+    Corners: a small square in each corner, minus the part outside the card's rounded outline.
+    In both cases we count how many pixels are much brighter than the normal border colour.
+    The background is left out by shape rather than colour, because whitening on a white or light
+    grey scanner lid is the same colour as the lid.
+
+    Args:
+        card (np.ndarray): Grayscale image cropped to the card
+
+    Returns:
+        Tuple[float, float]: (edges score, corners score)
+    """
+    height, width = card.shape
+    depth = max(1, min(height, width) // 60)
+    corner = max(depth * 2, min(height, width) // 15)
+
+    edge_strips = [
+        card[corner:-corner, :depth], card[corner:-corner, -depth:],
+        card[:depth, corner:-corner], card[-depth:, corner:-corner],
+    ]
+    # Each square is flipped so its outer corner is at the top left, to line up with the mask
+    corner_squares = [
+        card[:corner, :corner], card[:corner, -corner:][:, ::-1],
+        card[-corner:, :corner][::-1, :], card[-corner:, -corner:][::-1, ::-1],
+    ]
+    inside = _rounded_corner_mask(corner, CORNER_RADIUS_RATIO * width)
+    border_colour = float(np.median(np.concatenate([strip.ravel() for strip in edge_strips])))
+
+    edges = _wear_score(np.concatenate([strip.ravel() for strip in edge_strips]), border_colour)
+    # Each corner is scored on its own, and the worst one counts (one bad corner limits the grade)
+    corners = min(_wear_score(square[inside], border_colour) for square in corner_squares)
+    return round(edges, 1), round(corners, 1)
+
+def grade_scan(path: str, surface: float = 10.0) -> Dict:
+    """
+    Measure a scanned card and estimate its PSA grade.
+
+    Args:
+        path (str): Path to the scan of the front of the card
+        surface (float): Surface score (1-10), entered by the user because a scan can't show it well
+
+    Returns:
+        Dict: The measurements, the subscores, the estimated grade and how long it took
+    """
+    start = time.perf_counter()
+    gray = load_grayscale(path)
+    top, bottom, left, right = find_card_bounds(gray)
+    card = gray[top:bottom, left:right]
+
+    borders = measure_borders(card)
+    left_right = centering_ratio(borders["left"], borders["right"])
+    top_bottom = centering_ratio(borders["top"], borders["bottom"])
+    centering = centering_score(left_right, top_bottom)
+    edges, corners = measure_wear(card)
+
+    grade, explanation = estimate_psa_grade(centering, corners, edges, surface)
+    return {
+        "path": path,
+        "borders": borders,
+        "left_right": left_right,
+        "top_bottom": top_bottom,
+        "centering": centering,
+        "corners": corners,
+        "edges": edges,
+        "surface": surface,
+        "grade": grade,
+        "explanation": explanation,
+        "seconds": time.perf_counter() - start,
+    }
+
+def _grade_scan_safely(args: Tuple[str, float]) -> Dict:
+    """Worker for grade_folder: one broken image shouldn't stop the whole batch."""
+    path, surface = args
+    start = time.perf_counter()
+    try:
+        return grade_scan(path, surface)
+    except Exception as e:
+        return {"path": path, "error": str(e), "seconds": time.perf_counter() - start}
+
+def grade_folder(folder: str, surface: float = 10.0, max_workers: Optional[int] = None) -> List[Dict]:
+    """
+    Grade every scan in a folder, using all CPU cores.
+
+    Each image is graded in its own process, because the NumPy work is CPU-bound.
+
+    Args:
+        folder (str): Folder containing card scans
+        surface (float): Surface score used for every card
+        max_workers (Optional[int]): Number of processes (defaults to the number of CPU cores)
+
+    Returns:
+        List[Dict]: One result per image (see grade_scan). Failed images have an "error" key instead.
+    """
+    paths = sorted(
+        os.path.join(folder, name) for name in os.listdir(folder)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    if not paths:
+        return []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_grade_scan_safely, [(path, surface) for path in paths]))
+
+def print_timing_report(results: List[Dict], total_seconds: Optional[float] = None) -> None:
+    """
+    Print the grade and time taken for each image, plus totals.
+
+    Args:
+        results (List[Dict]): Results from grade_folder
+        total_seconds (Optional[float]): Wall-clock time for the whole batch, if measured
+    """
+    if not results:
+        print("No card scans found.")
+        return
+
+    print(f"\nGraded {len(results)} scans:")
+    print("-" * 80)
+    for result in results:
+        name = os.path.basename(result["path"])
+        if "error" in result:
+            print(f"{name}: ❌ {result['error']} ({result['seconds'] * 1000:.0f} ms)")
+            continue
+        lr = result["left_right"]
+        tb = result["top_bottom"]
+        print(
+            f"{name}: grade {result['grade']:.2f} | centering L/R {lr[0]:.0f}/{lr[1]:.0f} "
+            f"T/B {tb[0]:.0f}/{tb[1]:.0f} | edges {result['edges']:.1f} corners {result['corners']:.1f} "
+            f"| {result['seconds'] * 1000:.0f} ms"
+        )
+    print("-" * 80)
+
+    per_image = sum(result["seconds"] for result in results)
+    print(f"Total time in workers: {per_image:.2f} s (average {per_image / len(results) * 1000:.0f} ms per image)")
+    if total_seconds is not None:
+        print(f"Wall-clock time: {total_seconds:.2f} s")
+
+# Example usage: python -m pokeport.image_grading path/to/scans
+if __name__ == "__main__":
+    import sys
+
+    scan_folder = sys.argv[1] if len(sys.argv) > 1 else "."
+    batch_start = time.perf_counter()
+    batch_results = grade_folder(scan_folder)
+    print_timing_report(batch_results, time.perf_counter() - batch_start)
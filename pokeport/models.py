@@ -17,6 +17,10 @@ class PokemonCard:
     market_value: float = 0.0    # The current market value of the card
     grading_score: float = 0.0   # The grading score (e.g., 8.5 out of 10)
     image_url: Optional[str] = None  # Optional: a link to an image of the card
+    image_path: Optional[str] = None  # Optional: where the image is cached on disk (see image_cache.py)
+    quantity: int = 1                 # How many copies of this card we own
+    api_id: Optional[str] = None      # The Pokemon TCG API id (e.g. "base1-4"), if the card came from the API
+    condition: str = ""               # Optional: a short condition note (e.g. "Near Mint")
 
     def to_dict(self):
         """
@@ -39,5 +43,9 @@ class PokemonCard:
             purchase_price=data.get("purchase_price", 0.0),
             market_value=data.get("market_value", 0.0),
             grading_score=data.get("grading_score", 0.0),
-            image_url=data.get("image_url")
+            image_url=data.get("image_url"),
+            image_path=data.get("image_path"),
+            quantity=data.get("quantity", 1),
+            api_id=data.get("api_id"),
+            condition=data.get("condition", "")
         )
@@ -18,3 +18,20 @@ def calculate_roi(purchase_price, market_value):
     if purchase_price == 0:
         return 0  # Avoid division by zero
     return (market_value - purchase_price) / purchase_price
+
+def calculate_roi_array(purchase_prices, market_values):
+    """
+    Calculate ROI for many cards at once.
+
+    Takes two NumPy arrays (or lists) of the same length and returns an array of ROI values,
+    using the same formula as calculate_roi. Cards with no purchase price get an ROI of 0.
+    Needs NumPy (pip install numpy).
+    """
+    import numpy as np  # Only needed here, so the rest of the module works without NumPy
+
+    purchase = np.nan_to_num(np.asarray(purchase_prices, dtype=np.float64))
+    market = np.nan_to_num(np.asarray(market_values, dtype=np.float64))
+    roi = np.zeros_like(purchase)
+    # Only divide where the purchase price isn't zero (avoids division by zero, like calculate_roi)
+    np.divide(market - purchase, purchase, out=roi, where=purchase != 0)
+    return roi
@@ -0,0 +1,269 @@
+"""
+snapshot.py - Keeps a column-by-column copy of the collection's numbers for fast analytics.
+
+Why this file exists:
+> To work out things like "average grade" or "ROI per set", we were loading every card through get_all_cards() into a PokemonCard object, just to pull one or two numbers back out. This module saves the numeric columns (id, quantity, purchase price, market value, grade) as NumPy arrays on disk, one file per column. Set names and rarities are stored as small integer codes plus a list of the names ("dictionary encoding"), so they're numbers too. Opening the snapshot memory-maps the files, so nothing is copied until a value is actually used.
+
+How it stays up to date:
+- The database keeps a version number that goes up on every change (see storage.CHANGE_SCHEMA).
+- The snapshot remembers which database and version it was built from. Refreshing only reloads the cards that changed since then, unless so much changed that a full rebuild is quicker (or the database is a different one).
+- Every build is written to its own folder, and meta.json is switched over to it last, so a reader always sees one complete build.
+
+Next steps:
+- Add more columns (e.g. purchase dates) once the storage has them
+- Use the snapshot for ROI trend charts in the Streamlit UI
+
+Needs NumPy: pip install numpy
+"""
+
+import json
+import os
+import shutil
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from pokeport import storage
+from pokeport.grading import grade_distribution
+from pokeport.roi import calculate_roi_array
+
+# Where the snapshot lives on disk
+SNAPSHOT_DIR = "collection_snapshot"
+# If more than this share of the cards changed, rebuilding from scratch is simpler and just as fast
+FULL_REBUILD_RATIO = 0.5
+
+# Column name -> NumPy type. Missing prices/grades are stored as NaN.
+COLUMNS = {
+    "id": np.int64,
+    "quantity": np.int64,
+    "purchase_price": np.float64,
+    "market_value": np.float64,
+    "grading_score": np.float64,
+    "set_code": np.int32,
+    "rarity_code": np.int32,
+}
+
+class CollectionSnapshot:
+    """
+    The collection as NumPy columns.
+
+    Each column is an attribute (snapshot.market_value, snapshot.set_code, ...) and all columns line up
+    row by row, sorted by card id. set_code/rarity_code index into set_names/rarities.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], set_names: List[str], rarities: List[str], version: int,
+                 database: str = ""):
+        self.columns = columns
+        self.set_names = set_names
+        self.rarities = rarities
+        self.version = version
+        self.database = database  # The database it was built from (see _database)
+
+    def __getattr__(self, name: str) -> np.ndarray:
+        columns = self.__dict__.get("columns", {})
+        if name in columns:
+            return columns[name]
+        raise AttributeError(name)
+
+    def __len__(self) -> int:
+        return int(self.columns["id"].shape[0])
+
+def _meta_path(path: str) -> str:
+    return os.path.join(path, "meta.json")
+
+def _database() -> str:
+    """Identifies the database file: its absolute path plus its inode, which changes when the file is replaced."""
+    path = os.path.abspath(storage.DB_NAME)
+    try:
+        return f"{path}:{os.stat(path).st_ino}"
+    except FileNotFoundError:
+        return path
+
+def _is_current(snapshot: CollectionSnapshot, version: int) -> bool:
+    """True if the snapshot was built from this database at this version."""
+    return snapshot.database == _database() and snapshot.version == version
+
+def open_snapshot(path: str = SNAPSHOT_DIR) -> Optional[CollectionSnapshot]:
+    """
+    Open a saved snapshot without copying it (the column files are memory-mapped, read-only).
+
+    Args:
+        path (str): Snapshot folder
+
+    Returns:
+        Optional[CollectionSnapshot]: The snapshot, or None if there isn't one yet
+    """
+    try:
+        with open(_meta_path(path), "r", encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+        data_dir = os.path.join(path, meta["data_dir"])
+        columns = {
+            name: np.load(os.path.join(data_dir, f"{name}.npy"), mmap_mode="r")
+            for name in COLUMNS
+        }
+    except (FileNotFoundError, json.JSONDecodeError, KeyError, ValueError):
+        # No snapshot, one from an older layout, or its folder was just replaced by a newer build
+        return None
+    return CollectionSnapshot(columns, meta["set_names"], meta["rarities"], meta["version"], meta.get("database", ""))
+
+def _encode(values: List[str], dictionary: List[str]) -> np.ndarray:
+    """Turn strings into integer codes, adding any new strings to the end of the dictionary."""
+    lookup = {value: code for code, value in enumerate(dictionary)}
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        code = lookup.get(value)
+        if code is None:
+            code = lookup[value] = len(dictionary)
+            dictionary.append(value)
+        codes[i] = code
+    return codes
+
+def _rows_to_columns(rows: List[tuple], set_names: List[str], rarities: List[str]) -> Dict[str, np.ndarray]:
+    """Turn rows from storage.get_card_rows into arrays (see storage.CARD_ROW_COLUMNS for the order)."""
+    ids, quantities, purchase_prices, market_values, grades, sets, card_rarities = (
+        zip(*rows) if rows else ([], [], [], [], [], [], [])
+    )
+    return {
+        "id": np.array(ids, dtype=np.int64),
+        "quantity": np.array(quantities, dtype=np.int64),
+        # None becomes NaN for the float columns
+        "purchase_price": np.array(purchase_prices, dtype=np.float64),
+        "market_value": np.array(market_values, dtype=np.float64),
+        "grading_score": np.array(grades, dtype=np.float64),
+        "set_code": _encode(list(sets), set_names),
+        "rarity_code": _encode(list(card_rarities), rarities),
+    }
+
+def _write(path: str, snapshot: CollectionSnapshot) -> None:
+    """
+    Save the columns into a new folder, then point meta.json at it. The meta file is swapped in with one
+    atomic rename, so a reader sees either the old build or the new one, never a mix of the two.
+    Older builds are removed afterwards (readers that already opened them keep their memory maps).
+    """
+    data_dir = f"v{snapshot.version}-{time.time_ns()}"
+    os.makedirs(os.path.join(path, data_dir))
+    for name, dtype in COLUMNS.items():
+        np.save(os.path.join(path, data_dir, f"{name}.npy"), np.ascontiguousarray(snapshot.columns[name], dtype=dtype))
+    temp_meta = _meta_path(path) + ".tmp"
+    with open(temp_meta, "w", encoding="utf-8") as meta_file:
+        json.dump({
+            "version": snapshot.version,
+            "database": snapshot.database,
+            "data_dir": data_dir,
+            "rows": len(snapshot),
+            "set_names": snapshot.set_names,
+            "rarities": snapshot.rarities,
+        }, meta_file)
+    os.replace(temp_meta, _meta_path(path))
+
+    for entry in os.scandir(path):
+        if entry.name == data_dir:
+            continue
+        if entry.is_dir() and entry.name.startswith("v"):
+            shutil.rmtree(entry.path, ignore_errors=True)  # Fails harmlessly on Windows while a reader has it open
+        elif entry.name.endswith(".npy"):
+            try:
+                os.remove(entry.path)  # Column files from the old single-folder layout
+            except OSError:
+                pass
+
+def build_snapshot(path: str = SNAPSHOT_DIR, full: bool = False) -> CollectionSnapshot:
+    """
+    Bring the snapshot up to date with the database and save it.
+
+    Only the cards that changed since the last build are read from the database, unless there is no
+    snapshot yet, full=True, most of the collection changed, or the snapshot came from another database
+    (a different DB_NAME, or a file that was replaced and is now at an older version).
+
+    Args:
+        path (str): Snapshot folder
+        full (bool): Rebuild everything from scratch
+
+    Returns:
+        CollectionSnapshot: The refreshed snapshot (memory-mapped from disk)
+    """
+    old = None if full else open_snapshot(path)
+    database = _database()
+
+    if old is not None:
+        current_version = storage.get_collection_version()
+        if _is_current(old, current_version):
+            return old  # Nothing changed since the last build
+        if old.database != database or current_version < old.version:
+            old = None  # Built from another database (or the file was replaced), so its changes don't apply
+
+    if old is not None:
+        version, changed_ids, rows = storage.get_card_rows(since_version=old.version)
+        if len(changed_ids) <= FULL_REBUILD_RATIO * max(len(old), 1):
+            set_names = list(old.set_names)
+            rarities = list(old.rarities)
+            new_columns = _rows_to_columns(rows, set_names, rarities)
+            # Keep the rows that didn't change, drop the changed/deleted ones, add the fresh copies
+            keep = ~np.isin(old.id, np.array(changed_ids, dtype=np.int64))
+            merged = {
+                name: np.concatenate([np.asarray(old.columns[name])[keep], new_columns[name]])
+                for name in COLUMNS
+            }
+            order = np.argsort(merged["id"], kind="stable")
+            merged = {name: column[order] for name, column in merged.items()}
+            old = None  # Let go of the memory-mapped files before the old build is removed
+            _write(path, CollectionSnapshot(merged, set_names, rarities, version, database))
+            return open_snapshot(path)
+
+    old = None  # Full rebuild: let go of the old memory-mapped files before the old build is removed
+    version, _, rows = storage.get_card_rows()
+    set_names: List[str] = []
+    rarities: List[str] = []
+    columns = _rows_to_columns(rows, set_names, rarities)
+    _write(path, CollectionSnapshot(columns, set_names, rarities, version, database))
+    return open_snapshot(path)
+
+def get_snapshot(path: str = SNAPSHOT_DIR) -> CollectionSnapshot:
+    """Open the snapshot, refreshing it first if the database has changed since it was built."""
+    snapshot = open_snapshot(path)
+    if snapshot is not None and _is_current(snapshot, storage.get_collection_version()):
+        return snapshot
+    snapshot = None  # Let go of the memory-mapped files before the old build is removed
+    return build_snapshot(path)
+
+def collection_roi(snapshot: CollectionSnapshot) -> Dict:
+    """
+    Work out ROI for every card and for each set, straight from the snapshot columns.
+
+    Returns:
+        Dict: "per_card" (array of ROI values lined up with snapshot.id), "total" (whole collection ROI)
+              and "per_set" (set name -> ROI), all weighted by quantity
+    """
+    quantity = np.asarray(snapshot.quantity, dtype=np.float64)
+    cost = np.nan_to_num(np.asarray(snapshot.purchase_price)) * quantity
+    value = np.nan_to_num(np.asarray(snapshot.market_value)) * quantity
+
+    # np.bincount adds up cost/value per set code in one pass
+    set_count = len(snapshot.set_names)
+    set_cost = np.bincount(snapshot.set_code, weights=cost, minlength=set_count)
+    set_value = np.bincount(snapshot.set_code, weights=value, minlength=set_count)
+    set_roi = calculate_roi_array(set_cost, set_value)
+    present = np.bincount(snapshot.set_code, minlength=set_count) > 0
+
+    return {
+        "per_card": calculate_roi_array(snapshot.purchase_price, snapshot.market_value),
+        "total": float(calculate_roi_array(np.array([cost.sum()]), np.array([value.sum()]))[0]),
+        "per_set": {
+            snapshot.set_names[code]: float(set_roi[code]) for code in np.flatnonzero(present)
+        },
+    }
+
+def collection_grades(snapshot: CollectionSnapshot) -> Dict[int, int]:
+    """Count how many copies fall into each whole PSA grade (see grading.grade_distribution)."""
+    return grade_distribution(snapshot.grading_score, snapshot.quantity)
+
+# Example usage: python -m pokeport.snapshot
+if __name__ == "__main__":
+    current = build_snapshot()
+    print(f"Snapshot of {len(current)} cards at version {current.version}")
+    roi = collection_roi(current)
+    print(f"Collection ROI: {roi['total'] * 100:.1f}%")
+    for set_name, set_roi in sorted(roi["per_set"].items()):
+        print(f"  {set_name}: {set_roi * 100:.1f}%")
+    print(f"Grades: {collection_grades(current)}")
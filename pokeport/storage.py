@@ -2,48 +2,563 @@
 # This file handles saving and loading Pokemon card data using a SQLite database.
 # It provides functions to add, get, update, and delete cards in the database.
 
+import queue
+import re
 import sqlite3
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
 from pokeport.models import PokemonCard
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 
 # The name of the database file where card data is stored
 DB_NAME = 'pokemon_card_data.db'
 
-# This function creates the database and the table for storing Pokemon cards if they don't exist yet.
+# --- Card tables ---
+# Instead of one wide row per physical card (which repeats the name, set, rarity and image URL for
+# every copy), the data is split into three tables:
+# - catalog: one row per distinct card, keyed by the Pokemon TCG API id (e.g. "base1-4")
+# - collection_entry: what we own of a catalog card, with a quantity, condition, grade and market value
+# - purchase_lot: each time we bought copies of an entry, how many and at what price
+# Owning 40 copies of the same card is now one catalog row, one entry with quantity 40 and one lot
+# per purchase, and totals are worked out with joins on integer ids instead of comparing strings.
+CARD_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS catalog (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        api_id TEXT UNIQUE,
+        name TEXT NOT NULL,
+        set_name TEXT NOT NULL,
+        rarity TEXT NOT NULL,
+        image_url TEXT,
+        image_path TEXT);
+    CREATE INDEX IF NOT EXISTS catalog_lookup ON catalog (name, set_name, rarity);
+
+    CREATE TABLE IF NOT EXISTS collection_entry (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        catalog_id INTEGER NOT NULL REFERENCES catalog (id),
+        quantity INTEGER NOT NULL DEFAULT 1 CHECK (quantity >= 0),
+        condition TEXT NOT NULL DEFAULT '',
+        grading_score REAL,
+        market_value REAL);
+    CREATE INDEX IF NOT EXISTS collection_entry_catalog ON collection_entry (catalog_id);
+
+    CREATE TABLE IF NOT EXISTS purchase_lot (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        entry_id INTEGER NOT NULL REFERENCES collection_entry (id),
+        quantity INTEGER NOT NULL DEFAULT 1 CHECK (quantity >= 0),
+        unit_price REAL,
+        purchased_on TEXT);
+    CREATE INDEX IF NOT EXISTS purchase_lot_entry ON purchase_lot (entry_id);
+'''
+
+# The old one-row-per-card layout, rebuilt as a read-only view so existing queries keep working.
+# purchase_price is the average price paid per copy across all lots. When the lots hold no copies
+# (quantity 0) it is the plain average of their prices, and 0 when there is no price at all.
+CARD_VIEW = '''
+    CREATE VIEW pokemon AS
+        SELECT e.id, c.name, c.set_name, c.rarity,
+            (SELECT IFNULL(SUM(l.quantity * l.unit_price) / SUM(l.quantity), IFNULL(AVG(l.unit_price), 0))
+             FROM purchase_lot l WHERE l.entry_id = e.id) AS purchase_price,
+            e.market_value, e.grading_score, c.image_url, c.image_path, e.quantity, c.api_id, e.condition
+        FROM collection_entry e JOIN catalog c ON c.id = e.catalog_id
+'''
+
+# Columns read by _row_to_card, in order
+CARD_COLUMNS = 'id, name, set_name, rarity, purchase_price, market_value, grading_score, image_url, image_path, quantity, api_id, condition'
+
+# This function creates the database and the tables for storing Pokemon cards if they don't exist yet.
+# Databases from before the catalog tables existed are migrated in place.
 def init_db():
     # Connect to the database file (it will be created if it doesn't exist)
-    with sqlite3.connect(DB_NAME) as connection:
+    # isolation_level=None lets the migration control its own transaction
+    connection = sqlite3.connect(DB_NAME, isolation_level=None)
+    try:
         # Create a cursor to run SQL commands
         cursor = connection.cursor()
-        # Create the table for storing Pokemon cards
-        cursor.execute(''' 
-                       CREATE TABLE IF NOT EXISTS pokemon (
-                       id INTEGER PRIMARY KEY AUTOINCREMENT,
-                       name TEXT NOT NULL,
-                       set_name TEXT NOT NULL,
-                       rarity TEXT NOT NULL,
-                       purchase_price REAL,
-                       market_value REAL,
-                       grading_score REAL,
-                       image_url TEXT) ''')
-        # Print a message to show the database is ready
-        print("Database initialized and table created.")
+        row = cursor.execute("SELECT type FROM sqlite_master WHERE name = 'pokemon'").fetchone()
+        if row is not None and row[0] == 'table':
+            _migrate_pokemon_table(connection)
+        else:
+            # Create the card tables, then the running totals tables and the triggers that keep them up to date
+            cursor.executescript(CARD_SCHEMA + SUMMARY_SCHEMA + CHANGE_SCHEMA)
+            _create_card_view(cursor)
+            _create_summary_tables(cursor)
+    finally:
+        connection.close()
+    # Print a message to show the database is ready
+    print("Database initialized and table created.")
 
-# This function adds a new Pokemon card to the database.
-# It returns the ID of the new card.
-def add_card(card: PokemonCard) -> int:
+# This helper creates the pokemon view, or replaces it if a database made by an older version has a
+# different one. It leaves a matching view alone, and swaps an old one inside a single transaction,
+# so other connections (the server, the CLI) never find the view missing.
+def _create_card_view(cursor: sqlite3.Cursor) -> None:
+    row = cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'view' AND name = 'pokemon'").fetchone()
+    if row is not None and row[0].split() == CARD_VIEW.split():
+        return
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute('DROP VIEW IF EXISTS pokemon')
+        cursor.execute(CARD_VIEW)
+        cursor.execute('COMMIT')
+    except Exception:
+        cursor.execute('ROLLBACK')
+        raise
+
+# This helper works out the Pokemon TCG API id from an image URL, e.g.
+# "https://images.pokemontcg.io/svp/52.png" -> "svp-52". Cards added before we stored the id
+# still have their image URL, so this lets the migration link them to the right catalog entry.
+def _api_id_from_image_url(image_url: Optional[str]) -> Optional[str]:
+    if not image_url:
+        return None
+    match = re.search(r'pokemontcg\.io/([^/]+)/([^/_.]+)(?:_hires)?\.png$', image_url)
+    if match is None:
+        return None
+    return f"{match.group(1)}-{match.group(2)}"
+
+# This function moves an old-style pokemon table (one row per physical card) into the catalog tables.
+# Identical cards with the same grade and market value become one entry with a quantity, and copies
+# bought at the same price become one purchase lot. Everything happens in one transaction, so a
+# failure leaves the old table untouched.
+def _migrate_pokemon_table(connection: sqlite3.Connection) -> None:
+    cursor = connection.cursor()
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(pokemon)')]
+    # Very old databases were created before image_path existed
+    image_path_column = 'image_path' if 'image_path' in columns else 'NULL'
+    rows = cursor.execute(f'''
+        SELECT id, name, set_name, rarity, purchase_price, market_value, grading_score, image_url, {image_path_column}
+        FROM pokemon ORDER BY id
+    ''').fetchall()
+
+    # Build the new tables next to the old one. The old summary triggers point at the old table, so drop them first.
+    cursor.executescript(
+        'BEGIN IMMEDIATE;'
+        'DROP TRIGGER IF EXISTS pokemon_summary_insert;'
+        'DROP TRIGGER IF EXISTS pokemon_summary_delete;'
+        'DROP TRIGGER IF EXISTS pokemon_summary_update;'
+        'ALTER TABLE pokemon RENAME TO pokemon_old;'
+        + CARD_SCHEMA + CARD_VIEW + ';' + SUMMARY_SCHEMA + CHANGE_SCHEMA
+    )
+    try:
+        catalog_ids: Dict[tuple, int] = {}
+        entries: Dict[tuple, dict] = {}
+        for card_id, name, set_name, rarity, purchase_price, market_value, grading_score, image_url, image_path in rows:
+            catalog_key = (name, set_name, rarity, image_url)
+            if catalog_key not in catalog_ids:
+                catalog_ids[catalog_key] = _find_or_create_catalog(cursor, PokemonCard(
+                    name=name, set_name=set_name, rarity=rarity, image_url=image_url, image_path=image_path,
+                    api_id=_api_id_from_image_url(image_url)
+                ))
+            entry_key = (catalog_ids[catalog_key], grading_score, market_value)
+            # The entry keeps the lowest old id, so the first copy keeps the ID the user already knows
+            entry = entries.setdefault(entry_key, {"id": card_id, "lots": {}})
+            entry["lots"][purchase_price] = entry["lots"].get(purchase_price, 0) + 1
+
+        for (catalog_id, grading_score, market_value), entry in entries.items():
+            cursor.execute('''
+                INSERT INTO collection_entry (id, catalog_id, quantity, grading_score, market_value)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (entry["id"], catalog_id, sum(entry["lots"].values()), grading_score, market_value))
+            for unit_price, quantity in entry["lots"].items():
+                cursor.execute('INSERT INTO purchase_lot (entry_id, quantity, unit_price) VALUES (?, ?, ?)',
+                               (entry["id"], quantity, unit_price))
+
+        cursor.execute('DROP TABLE pokemon_old')
+        # The triggers counted every row we just inserted on top of the old totals, so start the totals fresh
+        _rebuild_summary(cursor)
+        cursor.execute('COMMIT')
+    except Exception:
+        cursor.execute('ROLLBACK')
+        raise
+    # Give the space used by the old table back to the file system
+    cursor.execute('VACUUM')
+    print(f"Migrated {len(rows)} cards into {len(entries)} collection entries.")
+
+# --- Running portfolio totals ---
+# Showing total cost/value would normally mean reading every card in the collection.
+# Instead we keep the totals in two small tables and let SQLite triggers adjust them whenever a card
+# is added, changed or deleted. Reading the headline numbers is then a single-row lookup, however
+# big the collection gets. Because the triggers live in the database, every way of writing
+# (add_card, update_card, the WriteQueue, even a SQL shell) keeps the totals correct.
+# card_count counts copies (so an entry with quantity 3 counts as 3), total_value is
+# quantity x market value, and total_cost comes from the purchase lots.
+SUMMARY_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS portfolio_summary (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        card_count INTEGER NOT NULL DEFAULT 0,
+        total_cost REAL NOT NULL DEFAULT 0,
+        total_value REAL NOT NULL DEFAULT 0);
+
+    CREATE TABLE IF NOT EXISTS set_summary (
+        set_name TEXT PRIMARY KEY,
+        card_count INTEGER NOT NULL DEFAULT 0,
+        total_cost REAL NOT NULL DEFAULT 0,
+        total_value REAL NOT NULL DEFAULT 0);
+
+    -- Entries change the card count and value
+    CREATE TRIGGER IF NOT EXISTS entry_summary_insert AFTER INSERT ON collection_entry
+    BEGIN
+        UPDATE portfolio_summary SET card_count = card_count + NEW.quantity,
+            total_value = total_value + NEW.quantity * IFNULL(NEW.market_value, 0)
+        WHERE id = 1;
+        INSERT OR IGNORE INTO set_summary (set_name) SELECT set_name FROM catalog WHERE id = NEW.catalog_id;
+        UPDATE set_summary SET card_count = card_count + NEW.quantity,
+            total_value = total_value + NEW.quantity * IFNULL(NEW.market_value, 0)
+        WHERE set_name = (SELECT set_name FROM catalog WHERE id = NEW.catalog_id);
+    END;
+
+    -- Remove the entry's purchase lots first (while the entry still exists, so the lot trigger can find its set)
+    CREATE TRIGGER IF NOT EXISTS entry_delete_lots BEFORE DELETE ON collection_entry
+    BEGIN
+        DELETE FROM purchase_lot WHERE entry_id = OLD.id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS entry_summary_delete AFTER DELETE ON collection_entry
+    BEGIN
+        UPDATE portfolio_summary SET card_count = card_count - OLD.quantity,
+            total_value = total_value - OLD.quantity * IFNULL(OLD.market_value, 0)
+        WHERE id = 1;
+        UPDATE set_summary SET card_count = card_count - OLD.quantity,
+            total_value = total_value - OLD.quantity * IFNULL(OLD.market_value, 0)
+        WHERE set_name = (SELECT set_name FROM catalog WHERE id = OLD.catalog_id);
+        DELETE FROM set_summary WHERE set_name = (SELECT set_name FROM catalog WHERE id = OLD.catalog_id)
+            AND NOT EXISTS (SELECT 1 FROM collection_entry e JOIN catalog c ON c.id = e.catalog_id
+                            WHERE c.set_name = set_summary.set_name);
+    END;
+
+    -- An update is handled as "take the old values out, put the new values in".
+    -- If the entry moved to a card in another set, its purchase cost moves with it.
+    CREATE TRIGGER IF NOT EXISTS entry_summary_update
+    AFTER UPDATE OF catalog_id, quantity, market_value ON collection_entry
+    BEGIN
+        UPDATE portfolio_summary SET card_count = card_count - OLD.quantity + NEW.quantity,
+            total_value = total_value - OLD.quantity * IFNULL(OLD.market_value, 0) + NEW.quantity * IFNULL(NEW.market_value, 0)
+        WHERE id = 1;
+        UPDATE set_summary SET card_count = card_count - OLD.quantity,
+            total_value = total_value - OLD.quantity * IFNULL(OLD.market_value, 0),
+            total_cost = total_cost - (SELECT IFNULL(SUM(quantity * IFNULL(unit_price, 0)), 0) FROM purchase_lot WHERE entry_id = OLD.id)
+        WHERE set_name = (SELECT set_name FROM catalog WHERE id = OLD.catalog_id);
+        INSERT OR IGNORE INTO set_summary (set_name) SELECT set_name FROM catalog WHERE id = NEW.catalog_id;
+        UPDATE set_summary SET card_count = card_count + NEW.quantity,
+            total_value = total_value + NEW.quantity * IFNULL(NEW.market_value, 0),
+            total_cost = total_cost + (SELECT IFNULL(SUM(quantity * IFNULL(unit_price, 0)), 0) FROM purchase_lot WHERE entry_id = NEW.id)
+        WHERE set_name = (SELECT set_name FROM catalog WHERE id = NEW.catalog_id);
+        DELETE FROM set_summary WHERE set_name = (SELECT set_name FROM catalog WHERE id = OLD.catalog_id)
+            AND NOT EXISTS (SELECT 1 FROM collection_entry e JOIN catalog c ON c.id = e.catalog_id
+                            WHERE c.set_name = set_summary.set_name);
+    END;
+
+    -- Renaming a catalog card's set (see _find_or_create_catalog) moves all of its entries to the new set
+    CREATE TRIGGER IF NOT EXISTS catalog_summary_update AFTER UPDATE OF set_name ON catalog
+    WHEN OLD.set_name IS NOT NEW.set_name
+    BEGIN
+        UPDATE set_summary SET
+            card_count = card_count - (SELECT IFNULL(SUM(quantity), 0) FROM collection_entry WHERE catalog_id = NEW.id),
+            total_value = total_value - (SELECT IFNULL(SUM(quantity * IFNULL(market_value, 0)), 0) FROM collection_entry WHERE catalog_id = NEW.id),
+            total_cost = total_cost - (SELECT IFNULL(SUM(l.quantity * IFNULL(l.unit_price, 0)), 0)
+                                       FROM purchase_lot l JOIN collection_entry e ON e.id = l.entry_id WHERE e.catalog_id = NEW.id)
+        WHERE set_name = OLD.set_name;
+        INSERT OR IGNORE INTO set_summary (set_name)
+            SELECT NEW.set_name WHERE EXISTS (SELECT 1 FROM collection_entry WHERE catalog_id = NEW.id);
+        UPDATE set_summary SET
+            card_count = card_count + (SELECT IFNULL(SUM(quantity), 0) FROM collection_entry WHERE catalog_id = NEW.id),
+            total_value = total_value + (SELECT IFNULL(SUM(quantity * IFNULL(market_value, 0)), 0) FROM collection_entry WHERE catalog_id = NEW.id),
+            total_cost = total_cost + (SELECT IFNULL(SUM(l.quantity * IFNULL(l.unit_price, 0)), 0)
+                                       FROM purchase_lot l JOIN collection_entry e ON e.id = l.entry_id WHERE e.catalog_id = NEW.id)
+        WHERE set_name = NEW.set_name;
+        DELETE FROM set_summary WHERE set_name = OLD.set_name
+            AND NOT EXISTS (SELECT 1 FROM collection_entry e JOIN catalog c ON c.id = e.catalog_id
+                            WHERE c.set_name = set_summary.set_name);
+    END;
+
+    -- Purchase lots change the total cost
+    CREATE TRIGGER IF NOT EXISTS lot_summary_insert AFTER INSERT ON purchase_lot
+    BEGIN
+        UPDATE portfolio_summary SET total_cost = total_cost + NEW.quantity * IFNULL(NEW.unit_price, 0) WHERE id = 1;
+        UPDATE set_summary SET total_cost = total_cost + NEW.quantity * IFNULL(NEW.unit_price, 0)
+        WHERE set_name = (SELECT c.set_name FROM collection_entry e JOIN catalog c ON c.id = e.catalog_id WHERE e.id = NEW.entry_id);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS lot_summary_delete AFTER DELETE ON purchase_lot
+    BEGIN
+        UPDATE portfolio_summary SET total_cost = total_cost - OLD.quantity * IFNULL(OLD.unit_price, 0) WHERE id = 1;
+        UPDATE set_summary SET total_cost = total_cost - OLD.quantity * IFNULL(OLD.unit_price, 0)
+        WHERE set_name = (SELECT c.set_name FROM collection_entry e JOIN catalog c ON c.id = e.catalog_id WHERE e.id = OLD.entry_id);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS lot_summary_update AFTER UPDATE OF entry_id, quantity, unit_price ON purchase_lot
+    BEGIN
+        UPDATE portfolio_summary SET
+            total_cost = total_cost - OLD.quantity * IFNULL(OLD.unit_price, 0) + NEW.quantity * IFNULL(NEW.unit_price, 0)
+        WHERE id = 1;
+        UPDATE set_summary SET total_cost = total_cost - OLD.quantity * IFNULL(OLD.unit_price, 0)
+        WHERE set_name = (SELECT c.set_name FROM collection_entry e JOIN catalog c ON c.id = e.catalog_id WHERE e.id = OLD.entry_id);
+        UPDATE set_summary SET total_cost = total_cost + NEW.quantity * IFNULL(NEW.unit_price, 0)
+        WHERE set_name = (SELECT c.set_name FROM collection_entry e JOIN catalog c ON c.id = e.catalog_id WHERE e.id = NEW.entry_id);
+    END;
+'''
+
+# --- Change tracking ---
+# collection_version is a counter that goes up every time anything about a card changes, and
+# entry_changes remembers the version at which each entry last changed (deleted entries stay in
+# the table, so we can tell they are gone). Anything that keeps its own copy of the collection
+# (like the analytics snapshot in snapshot.py) can ask "what changed since version N?" and only
+# reload those cards instead of everything.
+CHANGE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS collection_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL DEFAULT 0);
+    INSERT OR IGNORE INTO collection_version (id, version) VALUES (1, 0);
+
+    CREATE TABLE IF NOT EXISTS entry_changes (
+        entry_id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL);
+    CREATE INDEX IF NOT EXISTS entry_changes_version ON entry_changes (version);
+
+    CREATE TRIGGER IF NOT EXISTS entry_change_insert AFTER INSERT ON collection_entry
+    BEGIN
+        UPDATE collection_version SET version = version + 1 WHERE id = 1;
+        INSERT OR REPLACE INTO entry_changes SELECT NEW.id, version FROM collection_version WHERE id = 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS entry_change_update AFTER UPDATE ON collection_entry
+    BEGIN
+        UPDATE collection_version SET version = version + 1 WHERE id = 1;
+        INSERT OR REPLACE INTO entry_changes SELECT OLD.id, version FROM collection_version WHERE id = 1;
+        INSERT OR REPLACE INTO entry_changes SELECT NEW.id, version FROM collection_version WHERE id = 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS entry_change_delete AFTER DELETE ON collection_entry
+    BEGIN
+        UPDATE collection_version SET version = version + 1 WHERE id = 1;
+        INSERT OR REPLACE INTO entry_changes SELECT OLD.id, version FROM collection_version WHERE id = 1;
+    END;
+
+    -- A new or changed purchase lot changes its entry's average purchase price
+    CREATE TRIGGER IF NOT EXISTS lot_change_insert AFTER INSERT ON purchase_lot
+    BEGIN
+        UPDATE collection_version SET version = version + 1 WHERE id = 1;
+        INSERT OR REPLACE INTO entry_changes SELECT NEW.entry_id, version FROM collection_version WHERE id = 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS lot_change_update AFTER UPDATE ON purchase_lot
+    BEGIN
+        UPDATE collection_version SET version = version + 1 WHERE id = 1;
+        INSERT OR REPLACE INTO entry_changes SELECT OLD.entry_id, version FROM collection_version WHERE id = 1;
+        INSERT OR REPLACE INTO entry_changes SELECT NEW.entry_id, version FROM collection_version WHERE id = 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS lot_change_delete AFTER DELETE ON purchase_lot
+    BEGIN
+        UPDATE collection_version SET version = version + 1 WHERE id = 1;
+        INSERT OR REPLACE INTO entry_changes SELECT OLD.entry_id, version FROM collection_version WHERE id = 1;
+    END;
+
+    -- Changing a catalog card (e.g. fixing its set name) changes every entry that points at it
+    CREATE TRIGGER IF NOT EXISTS catalog_change_update AFTER UPDATE ON catalog
+    BEGIN
+        UPDATE collection_version SET version = version + 1 WHERE id = 1;
+        INSERT OR REPLACE INTO entry_changes
+            SELECT e.id, v.version FROM collection_entry e, collection_version v WHERE e.catalog_id = NEW.id AND v.id = 1;
+    END;
+'''
+
+# The same totals worked out the slow way, straight from the card tables.
+_PORTFOLIO_TOTALS_SQL = '''
+    SELECT (SELECT IFNULL(SUM(quantity), 0) FROM collection_entry),
+           (SELECT IFNULL(SUM(l.quantity * IFNULL(l.unit_price, 0)), 0)
+            FROM purchase_lot l JOIN collection_entry e ON e.id = l.entry_id),
+           (SELECT IFNULL(SUM(quantity * IFNULL(market_value, 0)), 0) FROM collection_entry)
+'''
+_SET_TOTALS_SQL = '''
+    SELECT c.set_name, SUM(e.quantity), IFNULL(SUM(lots.cost), 0), SUM(e.quantity * IFNULL(e.market_value, 0))
+    FROM collection_entry e
+    JOIN catalog c ON c.id = e.catalog_id
+    LEFT JOIN (SELECT entry_id, SUM(quantity * IFNULL(unit_price, 0)) AS cost FROM purchase_lot GROUP BY entry_id) lots
+        ON lots.entry_id = e.id
+    GROUP BY c.set_name
+'''
+
+def _create_summary_tables(cursor: sqlite3.Cursor) -> None:
+    # A brand new summary table starts empty, so fill it from whatever cards are already there
+    if cursor.execute('SELECT 1 FROM portfolio_summary WHERE id = 1').fetchone() is None:
+        cursor.execute('BEGIN IMMEDIATE')
+        _rebuild_summary(cursor)
+        cursor.execute('COMMIT')
+
+def _rebuild_summary(cursor: sqlite3.Cursor) -> None:
+    cursor.execute('DELETE FROM portfolio_summary')
+    cursor.execute('DELETE FROM set_summary')
+    cursor.execute('INSERT INTO portfolio_summary (id, card_count, total_cost, total_value) SELECT 1, * FROM (' + _PORTFOLIO_TOTALS_SQL + ')')
+    cursor.execute('INSERT INTO set_summary (set_name, card_count, total_cost, total_value) ' + _SET_TOTALS_SQL)
+
+# This function gets the headline numbers for the whole collection without scanning every card.
+# It returns a dictionary with card_count, total_cost and total_value.
+def get_portfolio_summary() -> dict:
     with sqlite3.connect(DB_NAME) as connection:
         cursor = connection.cursor()
-        # Insert the card data into the table
-        cursor.execute('''
-            INSERT INTO pokemon (name, set_name, rarity, purchase_price, market_value, grading_score, image_url)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (card.name, card.set_name, card.rarity, card.purchase_price, card.market_value, card.grading_score, card.image_url))
+        row = cursor.execute('SELECT card_count, total_cost, total_value FROM portfolio_summary WHERE id = 1').fetchone()
+        if row is None:
+            return {"card_count": 0, "total_cost": 0.0, "total_value": 0.0}
+        return {"card_count": row[0], "total_cost": row[1], "total_value": row[2]}
+
+# This function gets the running totals for each set, sorted by set name.
+def get_set_summaries() -> List[dict]:
+    with sqlite3.connect(DB_NAME) as connection:
+        cursor = connection.cursor()
+        rows = cursor.execute('SELECT set_name, card_count, total_cost, total_value FROM set_summary ORDER BY set_name').fetchall()
+        return [
+            {"set_name": row[0], "card_count": row[1], "total_cost": row[2], "total_value": row[3]}
+            for row in rows
+        ]
+
+# This function throws away the running totals and works them out again from the card tables.
+def rebuild_summary() -> None:
+    with sqlite3.connect(DB_NAME) as connection:
+        _rebuild_summary(connection.cursor())
         connection.commit()
+
+# This function checks the running totals against a full recount of the card tables.
+# It returns a list of the differences it found (an empty list means everything matches).
+# Pass repair=True to rebuild the totals when something doesn't match.
+def check_summary_consistency(repair: bool = False, tolerance: float = 0.005) -> List[str]:
+    problems = []
+    with sqlite3.connect(DB_NAME) as connection:
+        cursor = connection.cursor()
+        expected = {None: cursor.execute(_PORTFOLIO_TOTALS_SQL).fetchone()}
+        for row in cursor.execute(_SET_TOTALS_SQL):
+            expected[row[0]] = row[1:]
+
+        stored = {}
+        row = cursor.execute('SELECT card_count, total_cost, total_value FROM portfolio_summary WHERE id = 1').fetchone()
+        if row is not None:
+            stored[None] = row
+        for row in cursor.execute('SELECT set_name, card_count, total_cost, total_value FROM set_summary'):
+            stored[row[0]] = row[1:]
+
+        for key in sorted(set(expected) | set(stored), key=lambda k: (k is not None, k or "")):
+            label = "portfolio" if key is None else f"set '{key}'"
+            want = expected.get(key, (0, 0.0, 0.0))
+            have = stored.get(key)
+            if have is None:
+                problems.append(f"{label}: missing from summary")
+                continue
+            for column, want_value, have_value in zip(("card_count", "total_cost", "total_value"), want, have):
+                # Floating point sums can drift by tiny amounts, so only flag real differences
+                if abs(want_value - have_value) > tolerance:
+                    problems.append(f"{label}: {column} is {have_value}, expected {want_value}")
+
+        if problems and repair:
+            _rebuild_summary(cursor)
+            connection.commit()
+    return problems
+
+# This helper turns a row from the pokemon view (see CARD_COLUMNS) into a PokemonCard object.
+def _row_to_card(row) -> PokemonCard:
+    return PokemonCard(
+        id=row[0], name=row[1], set_name=row[2], rarity=row[3],
+        purchase_price=row[4], market_value=row[5], grading_score=row[6], image_url=row[7],
+        image_path=row[8], quantity=row[9], api_id=row[10], condition=row[11]
+    )
+
+# This helper finds the catalog row for a card, creating it if this card has never been seen before.
+# Cards from the API are matched on their API id; manual entries (no API id) on name, set and rarity.
+# Image details are filled in if the card brings ones the catalog doesn't have yet, and a card matched
+# on its API id updates the catalog's name, set and rarity, so edits made through update_card are kept.
+def _find_or_create_catalog(cursor: sqlite3.Cursor, card: PokemonCard) -> int:
+    if card.api_id:
+        row = cursor.execute('SELECT id, name, set_name, rarity, image_url, image_path FROM catalog WHERE api_id = ?',
+                             (card.api_id,)).fetchone()
+    else:
+        row = cursor.execute('''
+            SELECT id, name, set_name, rarity, image_url, image_path FROM catalog
+            WHERE name = ? AND set_name = ? AND rarity = ? AND api_id IS NULL
+        ''', (card.name, card.set_name, card.rarity)).fetchone()
+    if row is None:
+        cursor.execute('''
+            INSERT INTO catalog (api_id, name, set_name, rarity, image_url, image_path)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (card.api_id or None, card.name, card.set_name, card.rarity, card.image_url, card.image_path))
+        return cursor.lastrowid
+    catalog_id, name, set_name, rarity, image_url, image_path = row
+    # Only an API id match can differ here; the catalog_summary_update trigger moves the set totals
+    if (card.name, card.set_name, card.rarity) != (name, set_name, rarity):
+        cursor.execute('UPDATE catalog SET name = ?, set_name = ?, rarity = ? WHERE id = ?',
+                       (card.name, card.set_name, card.rarity, catalog_id))
+    if (card.image_url and card.image_url != image_url) or (card.image_path and card.image_path != image_path):
+        cursor.execute('UPDATE catalog SET image_url = ?, image_path = ? WHERE id = ?',
+                       (card.image_url or image_url, card.image_path or image_path, catalog_id))
+    return catalog_id
+
+# These helpers run the INSERT/UPDATE/DELETE on an open cursor without committing.
+# add_card/update_card/delete_card and the WriteQueue below share them so the SQL only lives in one place.
+# Adding a card we already have (same catalog card, condition, grade and market value) just adds to
+# its quantity with a new purchase lot, and returns the ID of the existing entry. A different market
+# value gets its own entry, so adding a card never changes the value of copies already owned
+# (use update_card for a price update).
+def _insert_card(cursor: sqlite3.Cursor, card: PokemonCard) -> int:
+    catalog_id = _find_or_create_catalog(cursor, card)
+    row = cursor.execute('''
+        SELECT id FROM collection_entry
+        WHERE catalog_id = ? AND condition = ? AND grading_score IS ? AND market_value IS ?
+    ''', (catalog_id, card.condition, card.grading_score, card.market_value)).fetchone()
+    if row is not None:
+        entry_id = row[0]
+        cursor.execute('UPDATE collection_entry SET quantity = quantity + ? WHERE id = ?', (card.quantity, entry_id))
+    else:
+        cursor.execute('''
+            INSERT INTO collection_entry (catalog_id, quantity, condition, grading_score, market_value)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (catalog_id, card.quantity, card.condition, card.grading_score, card.market_value))
         # Get the ID of the new card
         if cursor.lastrowid is None:
             raise RuntimeError("Failed to insert card and retrieve lastrowid.")
-        return cursor.lastrowid
+        entry_id = cursor.lastrowid
+    _insert_lot(cursor, entry_id, card.quantity, card.purchase_price)
+    return entry_id
+
+def _insert_lot(cursor: sqlite3.Cursor, entry_id: int, quantity: int, unit_price: Optional[float], purchased_on: Optional[str] = None) -> int:
+    cursor.execute('INSERT INTO purchase_lot (entry_id, quantity, unit_price, purchased_on) VALUES (?, ?, ?, ?)',
+                   (entry_id, quantity, unit_price, purchased_on))
+    return cursor.lastrowid
+
+# Updating sets the entry to exactly what the PokemonCard says. If the quantity or price changed,
+# the purchase lots are replaced by a single lot (use add_purchase_lot to keep a detailed history).
+def _update_card(cursor: sqlite3.Cursor, card: PokemonCard) -> int:
+    if card.id is None:
+        raise ValueError("Card must have an id to be updated.")
+    catalog_id = _find_or_create_catalog(cursor, card)
+    cursor.execute('''
+        UPDATE collection_entry SET catalog_id=?, quantity=?, condition=?, grading_score=?, market_value=?
+        WHERE id=?
+    ''', (catalog_id, card.quantity, card.condition, card.grading_score, card.market_value, card.id))
+    if cursor.rowcount == 0:
+        # Raising rolls back the catalog row created above, so a missing entry never gets a purchase lot
+        raise ValueError(f"No card with id {card.id}.")
+    # Same average as the pokemon view's purchase_price
+    lots = cursor.execute('''
+        SELECT SUM(quantity), IFNULL(SUM(quantity * unit_price) / SUM(quantity), IFNULL(AVG(unit_price), 0))
+        FROM purchase_lot WHERE entry_id = ?
+    ''', (card.id,)).fetchone()
+    lot_quantity, average_price = lots
+    price_changed = (average_price is None) != (card.purchase_price is None) or (
+        average_price is not None and abs(average_price - card.purchase_price) > 1e-9)
+    if lot_quantity != card.quantity or price_changed:
+        cursor.execute('DELETE FROM purchase_lot WHERE entry_id = ?', (card.id,))
+        _insert_lot(cursor, card.id, card.quantity, card.purchase_price)
+    return card.id
+
+def _delete_card(cursor: sqlite3.Cursor, card_id: int) -> int:
+    # Delete the entry with the given ID (a trigger removes its purchase lots)
+    cursor.execute('DELETE FROM collection_entry WHERE id=?', (card_id,))
+    return card_id
+
+# This function adds a new Pokemon card to the database.
+# It returns the ID of the collection entry (an existing one if we already own this card).
+def add_card(card: PokemonCard) -> int:
+    with sqlite3.connect(DB_NAME) as connection:
+        card_id = _insert_card(connection.cursor(), card)
+        connection.commit()
+        return card_id
 
 # This function gets a single Pokemon card from the database by its ID.
 # It returns a PokemonCard object, or None if the card is not found.
@@ -51,53 +566,272 @@ def get_card(card_id: int) -> Optional[PokemonCard]:
     with sqlite3.connect(DB_NAME) as connection:
         cursor = connection.cursor()
         # Select the card with the given ID
-        cursor.execute('SELECT * FROM pokemon WHERE id = ?', (card_id,))
+        cursor.execute(f'SELECT {CARD_COLUMNS} FROM pokemon WHERE id = ?', (card_id,))
         row = cursor.fetchone()
         if row:
             # Create a PokemonCard object from the row data
-            return PokemonCard(
-                id=row[0], name=row[1], set_name=row[2], rarity=row[3],
-                purchase_price=row[4], market_value=row[5], grading_score=row[6], image_url=row[7]
-            )
+            return _row_to_card(row)
         return None
 
 # This function gets all Pokemon cards from the database.
-# It returns a list of PokemonCard objects.
+# It returns a list of PokemonCard objects (one per collection entry, see PokemonCard.quantity).
 def get_all_cards() -> List[PokemonCard]:
     with sqlite3.connect(DB_NAME) as connection:
         cursor = connection.cursor()
-        # Select all cards from the table
-        cursor.execute('SELECT * FROM pokemon')
+        # Select all cards
+        cursor.execute(f'SELECT {CARD_COLUMNS} FROM pokemon ORDER BY id')
         rows = cursor.fetchall()
         # Create a list of PokemonCard objects from the rows
-        return [
-            PokemonCard(
-                id=row[0], name=row[1], set_name=row[2], rarity=row[3],
-                purchase_price=row[4], market_value=row[5], grading_score=row[6], image_url=row[7]
-            ) for row in rows
-        ]
+        return [_row_to_card(row) for row in rows]
+
+# This function gets one page of cards (sorted by ID) and how many cards there are in total,
+# so long collections can be shown a page at a time instead of loading everything.
+def get_cards_page(offset: int, limit: int) -> Tuple[List[PokemonCard], int]:
+    with sqlite3.connect(DB_NAME) as connection:
+        cursor = connection.cursor()
+        total = cursor.execute('SELECT COUNT(*) FROM collection_entry').fetchone()[0]
+        cursor.execute(f'SELECT {CARD_COLUMNS} FROM pokemon ORDER BY id LIMIT ? OFFSET ?', (limit, offset))
+        return [_row_to_card(row) for row in cursor.fetchall()], total
 
 # This function updates an existing Pokemon card in the database.
 # The card must have an ID.
 def update_card(card: PokemonCard) -> None:
     if card.id is None:
         raise ValueError("Card must have an id to be updated.")
+    with sqlite3.connect(DB_NAME) as connection:
+        _update_card(connection.cursor(), card)
+        connection.commit()
+
+# This function records where a card's image was saved on disk (see image_cache.py).
+# The path is stored on the catalog card, so every copy shares it.
+def update_image_path(card_id: int, image_path: Optional[str]) -> None:
     with sqlite3.connect(DB_NAME) as connection:
         cursor = connection.cursor()
-        # Update the card data in the table
         cursor.execute('''
-            UPDATE pokemon SET name=?, set_name=?, rarity=?, purchase_price=?, market_value=?, grading_score=?, image_url=?
-            WHERE id=?
-        ''', (card.name, card.set_name, card.rarity, card.purchase_price, card.market_value, card.grading_score, card.image_url, card.id))
+            UPDATE catalog SET image_path=? WHERE id = (SELECT catalog_id FROM collection_entry WHERE id=?)
+        ''', (image_path, card_id))
+        connection.commit()
+
+# This function records buying more copies of a card we already own.
+# It returns the ID of the new purchase lot.
+def add_purchase_lot(card_id: int, quantity: int, unit_price: float, purchased_on: Optional[str] = None) -> int:
+    with sqlite3.connect(DB_NAME) as connection:
+        cursor = connection.cursor()
+        if cursor.execute('SELECT 1 FROM collection_entry WHERE id = ?', (card_id,)).fetchone() is None:
+            raise ValueError(f"No card with id {card_id}.")
+        cursor.execute('UPDATE collection_entry SET quantity = quantity + ? WHERE id = ?', (quantity, card_id))
+        lot_id = _insert_lot(cursor, card_id, quantity, unit_price, purchased_on)
         connection.commit()
+        return lot_id
+
+# This function gets the purchase history of a card, oldest first.
+def get_purchase_lots(card_id: int) -> List[dict]:
+    with sqlite3.connect(DB_NAME) as connection:
+        cursor = connection.cursor()
+        rows = cursor.execute('''
+            SELECT id, quantity, unit_price, purchased_on FROM purchase_lot WHERE entry_id = ? ORDER BY id
+        ''', (card_id,)).fetchall()
+        return [
+            {"id": row[0], "quantity": row[1], "unit_price": row[2], "purchased_on": row[3]}
+            for row in rows
+        ]
+
+# This function gets every distinct (name, set name) pair we own, sorted by name.
+# cache_warmer.py uses it to pre-load API searches for cards already in the collection.
+def get_owned_name_set_pairs() -> List[Tuple[str, str]]:
+    with sqlite3.connect(DB_NAME) as connection:
+        cursor = connection.cursor()
+        cursor.execute('SELECT DISTINCT name, set_name FROM pokemon WHERE quantity > 0 ORDER BY name, set_name')
+        return [(row[0], row[1]) for row in cursor.fetchall()]
+
+# This function gets the collection version: a number that goes up every time any card changes.
+# If it's the same as last time you looked, nothing has changed.
+def get_collection_version() -> int:
+    with sqlite3.connect(DB_NAME) as connection:
+        row = connection.execute('SELECT version FROM collection_version WHERE id = 1').fetchone()
+        return row[0] if row else 0
+
+# Columns read by get_card_rows, in order
+CARD_ROW_COLUMNS = ('id', 'quantity', 'purchase_price', 'market_value', 'grading_score', 'set_name', 'rarity')
+
+# This function gets the raw column values of the collection for analytics (see snapshot.py).
+# If since_version is given, only entries changed after that version are returned, plus the IDs of
+# every changed entry (deleted ones included, so the caller can drop them).
+# It returns (current version, changed entry IDs or None, rows), all read at the same moment.
+def get_card_rows(since_version: Optional[int] = None) -> Tuple[int, Optional[List[int]], List[tuple]]:
+    connection = sqlite3.connect(DB_NAME, isolation_level=None)
+    try:
+        # One read transaction so the version and the rows match each other
+        connection.execute('BEGIN')
+        version = connection.execute('SELECT version FROM collection_version WHERE id = 1').fetchone()[0]
+        columns = ', '.join(CARD_ROW_COLUMNS)
+        if since_version is None:
+            rows = connection.execute(f'SELECT {columns} FROM pokemon ORDER BY id').fetchall()
+            changed_ids = None
+        else:
+            changed_ids = [row[0] for row in connection.execute(
+                'SELECT entry_id FROM entry_changes WHERE version > ? ORDER BY entry_id', (since_version,))]
+            rows = connection.execute(f'''
+                SELECT {columns} FROM pokemon
+                WHERE id IN (SELECT entry_id FROM entry_changes WHERE version > ?) ORDER BY id
+            ''', (since_version,)).fetchall()
+        connection.execute('COMMIT')
+        return version, changed_ids, rows
+    finally:
+        connection.close()
 
 # This function deletes a Pokemon card from the database by its ID.
 def delete_card(card_id: int) -> None:
     with sqlite3.connect(DB_NAME) as connection:
-        cursor = connection.cursor()
-        # Delete the card with the given ID
-        cursor.execute('DELETE FROM pokemon WHERE id=?', (card_id,))
+        _delete_card(connection.cursor(), card_id)
         connection.commit()
 
+# --- Group-commit write queue ---
+# When several threads (or async tasks) write at the same time, each add_card/update_card call opens
+# its own connection and commits on its own, so they all fight over SQLite's single write lock and
+# some of them fail with "database is locked". The WriteQueue fixes that by having exactly ONE thread
+# do all the writing. Producers just drop their write into a queue and get a Future back. The writer
+# thread collects whatever is waiting and commits it together in one transaction ("group commit"),
+# so 50 writes cost one commit instead of 50.
+#
+# Async code can await a result with: await asyncio.wrap_future(queue.add_card(card))
+class WriteQueue:
+    # max_batch: commit as soon as this many writes are waiting
+    # max_delay: or once the oldest waiting write is this many seconds old
+    def __init__(self, db_name: Optional[str] = None, max_batch: int = 100, max_delay: float = 0.01):
+        self.db_name = db_name or DB_NAME
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: "queue.Queue[Optional[Tuple[Callable, object, Future]]]" = queue.Queue()
+        self._closed = False
+        self._close_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="pokeport-writer", daemon=True)
+        self._thread.start()
+
+    # Queue a new card. The Future resolves to the new card's ID once it is committed.
+    def add_card(self, card: PokemonCard) -> "Future[int]":
+        return self._submit(_insert_card, card)
+
+    # Queue an update. The Future resolves to the card's ID once it is committed.
+    def update_card(self, card: PokemonCard) -> "Future[int]":
+        if card.id is None:
+            raise ValueError("Card must have an id to be updated.")
+        return self._submit(_update_card, card)
+
+    # Queue a delete. The Future resolves to the deleted card's ID once it is committed.
+    def delete_card(self, card_id: int) -> "Future[int]":
+        return self._submit(_delete_card, card_id)
+
+    def _submit(self, operation: Callable, argument: object) -> "Future[int]":
+        future: "Future[int]" = Future()
+        with self._close_lock:
+            if self._closed:
+                raise RuntimeError("WriteQueue is closed.")
+            self._queue.put((operation, argument, future))
+        return future
+
+    # Stop accepting writes, commit everything still waiting and stop the writer thread.
+    def close(self) -> None:
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)  # Tells the writer thread to finish up
+        self._thread.join()
+
+    def __enter__(self) -> "WriteQueue":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    # Wait for the first write, then keep collecting until the batch is full or the deadline passes.
+    # Returns the batch and whether close() was called.
+    def _next_batch(self) -> Tuple[list, bool]:
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                # Grab anything already waiting without blocking, then wait until the deadline
+                item = self._queue.get_nowait() if remaining <= 0 else self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        # isolation_level=None means we control BEGIN/COMMIT ourselves
+        connection = sqlite3.connect(self.db_name, isolation_level=None, check_same_thread=False)
+        try:
+            stopping = False
+            while not stopping:
+                batch, stopping = self._next_batch()
+                if batch:
+                    self._commit_batch(connection, batch)
+        finally:
+            connection.close()
+
+    def _commit_batch(self, connection: sqlite3.Connection, batch: list) -> None:
+        # Writes whose Future was cancelled while waiting are skipped; the rest can't be cancelled from here on
+        batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        cursor = connection.cursor()
+        results = []
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            for operation, argument, future in batch:
+                # A savepoint per write means one bad write only fails its own Future,
+                # not everyone else's in the same batch
+                cursor.execute('SAVEPOINT write')
+                try:
+                    results.append((future, operation(cursor, argument), None))
+                    cursor.execute('RELEASE write')
+                except Exception as e:
+                    cursor.execute('ROLLBACK TO write')
+                    cursor.execute('RELEASE write')
+                    results.append((future, None, e))
+            cursor.execute('COMMIT')
+        except Exception as e:
+            # The whole transaction failed (e.g. the disk is full), so every write in it failed
+            if connection.in_transaction:
+                connection.rollback()
+            results = [(future, None, e) for _, _, future in batch]
+        # Only tell producers about their writes once they are safely committed
+        for future, result, error in results:
+            _resolve_future(future, result, error)
+
+# Hand a result (or error) to a Future. A Future that can't take it must never stop the writer thread.
+def _resolve_future(future: Future, result: object, error: Optional[BaseException]) -> None:
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+# One shared WriteQueue for the whole app, created the first time it is needed.
+_write_queue: Optional[WriteQueue] = None
+_write_queue_lock = threading.Lock()
 
+def get_write_queue() -> WriteQueue:
+    global _write_queue
+    with _write_queue_lock:
+        if _write_queue is None:
+            _write_queue = WriteQueue()
+        return _write_queue
 
+# Commit any waiting writes and stop the shared writer thread (call this before the program exits).
+def close_write_queue() -> None:
+    global _write_queue
+    with _write_queue_lock:
+        if _write_queue is not None:
+            _write_queue.close()
+            _write_queue = None
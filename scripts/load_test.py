@@ -0,0 +1,98 @@
+"""
+load_test.py - Hammers the local PokePort server with many clients at once.
+
+Why this file exists:
+> The server is meant to cope with hundreds of local clients (a UI, scripts, several browser tabs). This script checks that by opening lots of connections at the same time, each sending requests over a keep-alive connection, and reports requests per second, response times and status codes. Clients remember ETags and send If-None-Match, like a browser would, so the 304 path gets exercised too.
+
+How to use it (with the server already running):
+    python scripts/load_test.py --clients 300 --requests 50
+    python scripts/load_test.py --paths /summary /cards?page=1 --clients 500
+
+Only uses the standard library, so it runs anywhere the server does.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+DEFAULT_PATHS = ["/cards?page=1&page_size=50", "/summary", "/grade?centering=9&corners=9&edges=8&surface=9", "/roi?purchase_price=10&market_value=15"]
+
+async def _request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str, path: str, etag: str) -> Tuple[int, str]:
+    """Send one GET and read the reply. Returns (status code, ETag)."""
+    headers = f"GET {path} HTTP/1.1\r\nHost: {host}\r\n"
+    if etag:
+        headers += f"If-None-Match: {etag}\r\n"
+    writer.write((headers + "\r\n").encode("latin-1"))
+    await writer.drain()
+
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+    status = int(head[0].split(" ")[1])
+    reply_headers = {}
+    for line in head[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            reply_headers[name.strip().lower()] = value.strip()
+    length = int(reply_headers.get("content-length", "0"))
+    if length:
+        await reader.readexactly(length)
+    return status, reply_headers.get("etag", "")
+
+async def _client(host: str, port: int, paths: List[str], count: int, latencies: List[float], statuses: Counter) -> None:
+    """One client: a single keep-alive connection sending `count` requests."""
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError as e:
+        statuses[f"connect error: {e.__class__.__name__}"] += count
+        return
+    etags: Dict[str, str] = {}
+    try:
+        for _ in range(count):
+            path = random.choice(paths)
+            start = time.perf_counter()
+            try:
+                status, etag = await _request(reader, writer, host, path, etags.get(path, ""))
+            except (asyncio.IncompleteReadError, ConnectionError) as e:
+                statuses[f"error: {e.__class__.__name__}"] += 1
+                break
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+            if etag:
+                etags[path] = etag
+    finally:
+        writer.close()
+
+def _percentile(sorted_values: List[float], share: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(share * len(sorted_values)))]
+
+async def run(host: str, port: int, clients: int, requests_per_client: int, paths: List[str]) -> None:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        _client(host, port, paths, requests_per_client, latencies, statuses) for _ in range(clients)
+    ))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"{clients} clients x {requests_per_client} requests in {elapsed:.2f} s")
+    print(f"Throughput: {len(latencies) / elapsed:.0f} requests/s")
+    print(
+        f"Latency: p50 {_percentile(latencies, 0.50) * 1000:.1f} ms | p95 {_percentile(latencies, 0.95) * 1000:.1f} ms"
+        f" | p99 {_percentile(latencies, 0.99) * 1000:.1f} ms | max {(latencies[-1] if latencies else 0) * 1000:.1f} ms"
+    )
+    print("Status codes: " + ", ".join(f"{status}: {count}" for status, count in sorted(statuses.items(), key=str)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the PokePort server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--clients", type=int, default=200, help="How many connections at the same time")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per connection")
+    parser.add_argument("--paths", nargs="+", default=DEFAULT_PATHS, help="Paths to pick from at random")
+    args = parser.parse_args()
+    asyncio.run(run(args.host, args.port, args.clients, args.requests, args.paths))
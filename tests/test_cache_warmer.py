@@ -0,0 +1,123 @@
+"""
+Tests for api.prefetch_search, the per-entry expiry of the API cache, and cache_warmer.py.
+
+API requests are replaced by mocks, so no network is needed.
+
+Run with: python -m pytest tests
+"""
+
+import threading
+import time
+import unittest
+from unittest import mock
+
+from pokeport import api, cache_warmer
+
+PIKACHU = {"id": "base1-58", "name": "Pikachu", "set": {"name": "Base Set"}}
+PROMO = {"id": "basep-1", "name": "Pikachu", "set": {"name": "Wizards Black Star Promos"}}
+
+class ApiCacheTestCase(unittest.TestCase):
+    """Starts every test with an empty API cache and a fake _request_cards."""
+
+    def setUp(self):
+        api._cache.clear()
+        patch = mock.patch.object(api, "_request_cards", return_value=[PIKACHU, PROMO])
+        self.request_cards = patch.start()
+        self.addCleanup(patch.stop)
+        self.addCleanup(api._cache.clear)
+
+class TestCacheExpiry(ApiCacheTestCase):
+    def test_each_entry_keeps_its_own_timeout(self):
+        api._set_cached_data("short", [PIKACHU])
+        api._set_cached_data("long", [PIKACHU], timeout=api.PREFETCH_CACHE_TIMEOUT)
+        later = time.time() + api._cache_timeout + 1
+        with mock.patch.object(api.time, "time", return_value=later):
+            self.assertIsNone(api._get_cached_data("short"))
+            self.assertEqual(api._get_cached_data("long"), [PIKACHU])
+        self.assertNotIn("short", api._cache)  # Expired entries are removed
+
+class TestPrefetchSearch(ApiCacheTestCase):
+    def test_results_are_cached_for_the_session(self):
+        self.assertTrue(api.prefetch_search("Pikachu"))
+        self.request_cards.assert_called_once_with({"q": "name:Pikachu", "pageSize": 250}, background=True, cancel=None)
+        data, expires = api._cache[api._name_cache_key("Pikachu")]
+        self.assertEqual(data, [PIKACHU, PROMO])
+        self.assertGreater(expires, time.time() + api.PREFETCH_CACHE_TIMEOUT - 60)
+
+    def test_promo_set_search_keeps_only_promos(self):
+        self.assertTrue(api.prefetch_search("Pikachu", "Black Star Promos"))
+        self.assertEqual(api._get_cached_data(api._advanced_cache_key("Pikachu", "Black Star Promos")), [PROMO])
+
+    def test_cached_search_is_skipped(self):
+        api._set_cached_data(api._name_cache_key("Pikachu"), [PIKACHU])
+        self.assertFalse(api.prefetch_search("pikachu"))
+        self.request_cards.assert_not_called()
+
+    def test_user_result_is_not_overwritten(self):
+        key = api._name_cache_key("Pikachu")
+
+        def user_search_finishes_first(params, background=False, cancel=None):
+            api._set_cached_data(key, [PIKACHU])
+            return [PIKACHU, PROMO]
+
+        self.request_cards.side_effect = user_search_finishes_first
+        self.assertTrue(api.prefetch_search("Pikachu"))
+        data, expires = api._cache[key]
+        self.assertEqual(data, [PIKACHU])
+        self.assertLess(expires, time.time() + api._cache_timeout + 60)
+
+    def test_failed_or_cancelled_request_caches_nothing(self):
+        for outcome in (None, api.requests.exceptions.ConnectionError("offline")):
+            with self.subTest(outcome=outcome):
+                self.request_cards.side_effect = [outcome] if outcome is None else outcome
+                self.assertFalse(api.prefetch_search("Pikachu"))
+                self.assertEqual(api._cache, {})
+
+class TestCacheWarmer(unittest.TestCase):
+    def setUp(self):
+        pairs = [("Pikachu", "Base Set"), ("Mew", "Wizards Black Star Promos"), ("Pikachu", "Jungle"), ("Mew", "")]
+        patches = [
+            mock.patch.object(cache_warmer, "get_owned_name_set_pairs", return_value=pairs),
+            mock.patch.object(cache_warmer, "prefetch_search", return_value=True),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_name_searches_come_first_and_promo_sets_are_skipped(self):
+        self.assertEqual(cache_warmer.CacheWarmer()._searches(),
+                         [("Pikachu", ""), ("Mew", ""), ("Pikachu", "Base Set"), ("Pikachu", "Jungle")])
+        self.assertEqual(cache_warmer.CacheWarmer(include_sets=False)._searches(), [("Pikachu", ""), ("Mew", "")])
+
+    def test_only_fetched_searches_are_counted(self):
+        cache_warmer.prefetch_search.side_effect = [True, False, True, False]
+        warmer = cache_warmer.start_cache_warmer()
+        warmer._thread.join(5)
+        self.assertFalse(warmer.is_running())
+        self.assertEqual(warmer.fetched, 2)
+        self.assertEqual(cache_warmer.prefetch_search.call_count, 4)
+
+    def test_stop_cancels_a_waiting_search(self):
+        started = threading.Event()
+
+        def wait_for_rate_limit(name, set_name="", cancel=None):
+            started.set()
+            cancel.wait(10)
+            return False  # Cancelled while waiting
+
+        cache_warmer.prefetch_search.side_effect = wait_for_rate_limit
+        warmer = cache_warmer.start_cache_warmer()
+        self.assertTrue(started.wait(5))
+        warmer.stop()
+        self.assertFalse(warmer.is_running())
+        self.assertEqual((warmer.fetched, cache_warmer.prefetch_search.call_count), (0, 1))
+
+    def test_missing_database_ends_quietly(self):
+        cache_warmer.get_owned_name_set_pairs.side_effect = RuntimeError("no database")
+        warmer = cache_warmer.start_cache_warmer()
+        warmer._thread.join(5)
+        self.assertEqual(warmer.fetched, 0)
+        cache_warmer.prefetch_search.assert_not_called()
+
+if __name__ == "__main__":
+    unittest.main()
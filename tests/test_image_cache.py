@@ -0,0 +1,171 @@
+"""
+Tests for image_cache.py: content-addressed storage, LRU eviction (thumbnails included), keeping
+recency between sessions and what prefetch_collection saves to the database.
+
+Downloads are replaced by a fake requests.get, so no network is needed.
+
+Run with: python -m pytest tests
+"""
+
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+from pokeport import image_cache, storage
+from pokeport.models import PokemonCard
+
+IMAGE_BYTES = 1000
+
+def _fake_get(url, timeout=None):
+    """Every URL gets its own image of IMAGE_BYTES bytes; URLs ending in "-copy" get the same one as without."""
+    response = mock.Mock()
+    response.content = url.replace("-copy", "").encode("utf-8").ljust(IMAGE_BYTES, b"\0")
+    response.raise_for_status.return_value = None
+    return response
+
+def _png(url, timeout=None):
+    """A real (small) PNG, for the thumbnail tests."""
+    buffer = io.BytesIO()
+    Image.new("RGB", (300, 420), (len(url) * 7 % 256, 100, 50)).save(buffer, format="PNG")
+    response = mock.Mock()
+    response.content = buffer.getvalue()
+    response.raise_for_status.return_value = None
+    return response
+
+class ImageCacheTestCase(unittest.TestCase):
+    """Points the cache at a temporary folder and starts every test with an empty, unloaded index."""
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        patches = [
+            mock.patch.object(image_cache, "CACHE_DIR", os.path.join(self._temp_dir.name, "image_cache")),
+            mock.patch.object(image_cache.requests, "get", side_effect=_fake_get),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self._new_session()
+
+    def tearDown(self):
+        self._new_session()
+        self._temp_dir.cleanup()
+
+    def _new_session(self):
+        """Forget the in-memory index, as if the program had restarted."""
+        image_cache._index.clear()
+        image_cache._index_loaded = False
+        image_cache._index_saved_at = 0.0
+        image_cache._index_dirty = False
+
+class TestImageCache(ImageCacheTestCase):
+    def test_same_picture_is_stored_once(self):
+        first = image_cache.get_image_path("http://img/a")
+        second = image_cache.get_image_path("http://img/a-copy")
+        self.assertEqual(first, second)
+        self.assertEqual(image_cache.get_image_path("http://img/a"), first)
+        self.assertEqual(image_cache.requests.get.call_count, 2)  # The repeat was a cache hit
+
+    def test_least_recently_used_image_is_evicted(self):
+        with mock.patch.object(image_cache, "MAX_CACHE_BYTES", 2 * IMAGE_BYTES):
+            old = image_cache.get_image_path("http://img/a")
+            image_cache.get_image_path("http://img/b")
+            image_cache.get_image_path("http://img/a")  # a is now more recent than b
+            image_cache.get_image_path("http://img/c")
+        self.assertEqual(sorted(image_cache._index), ["http://img/a", "http://img/c"])
+        self.assertTrue(os.path.exists(old))
+
+    def test_recency_survives_a_restart(self):
+        image_cache.get_image_path("http://img/a")
+        image_cache.get_image_path("http://img/b")
+        with mock.patch.object(image_cache, "INDEX_SAVE_INTERVAL", 0):
+            image_cache.get_image_path("http://img/a")  # Only a lookup, no download
+        self._new_session()
+        with mock.patch.object(image_cache, "MAX_CACHE_BYTES", 2 * IMAGE_BYTES):
+            image_cache.get_image_path("http://img/c")
+        self.assertEqual(sorted(image_cache._index), ["http://img/a", "http://img/c"])
+
+    def test_lookups_are_saved_at_exit(self):
+        image_cache.get_image_path("http://img/a")
+        with mock.patch.object(image_cache, "INDEX_SAVE_INTERVAL", 3600):
+            image_cache.get_image_path("http://img/a")
+            image_cache._flush_index()
+        with open(image_cache._index_path(), encoding="utf-8") as index_file:
+            saved = json.load(index_file)
+        self.assertEqual(saved["http://img/a"]["last_used"], image_cache._index["http://img/a"]["last_used"])
+
+    def test_batch_only_returns_images_still_cached(self):
+        with mock.patch.object(image_cache, "MAX_CACHE_BYTES", int(3.5 * IMAGE_BYTES)):
+            paths = image_cache.fetch_images(f"http://img/{name}" for name in "abcde")
+        kept = [path for path in paths.values() if path is not None]
+        self.assertEqual(len(kept), 3)
+        self.assertTrue(all(os.path.exists(path) for path in kept))
+
+    def test_map_image_reads_without_copying(self):
+        path = image_cache.get_image_path("http://img/a")
+        with image_cache.map_image(path) as data:
+            self.assertIsInstance(data, memoryview)
+            self.assertTrue(data.readonly)
+            self.assertEqual(bytes(data[:12]), b"http://img/a")
+
+    def test_clear_removes_every_file(self):
+        image_cache.get_image_path("http://img/a")
+        image_cache.clear_image_cache()
+        objects = os.path.join(image_cache.CACHE_DIR, "objects")
+        self.assertEqual([name for _, _, names in os.walk(objects) for name in names], [])
+        self.assertEqual(image_cache._index, {})
+
+class TestThumbnails(ImageCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        image_cache.requests.get.side_effect = _png
+
+    def _files(self, folder):
+        return sorted(os.listdir(os.path.join(image_cache.CACHE_DIR, folder)))
+
+    def test_thumbnails_count_towards_the_cache_size(self):
+        path = image_cache.get_image_path("http://img/a")
+        image_size = os.path.getsize(path)
+        with mock.patch.object(image_cache, "MAX_CACHE_BYTES", 2 * image_size + 100):
+            image_cache.get_image_path("http://img/bb")
+            image_cache.get_thumbnail_path("http://img/a", (120, 168))
+            image_cache.get_thumbnail_path("http://img/a", (60, 84))
+        # The thumbnails pushed the cache over its size, so the least recently used image went
+        self.assertEqual(sorted(image_cache._index), ["http://img/a"])
+
+    def test_evicting_an_image_removes_all_its_thumbnails(self):
+        image_cache.get_thumbnail_path("http://img/a", (120, 168))
+        image_cache.get_thumbnail_path("http://img/a", (60, 84))
+        self.assertEqual(len(self._files("thumbs")), 2)
+        image_cache.clear_image_cache()
+        self.assertEqual(self._files("thumbs"), [])
+
+class TestPrefetchCollection(ImageCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self._old_db_name = storage.DB_NAME
+        storage.DB_NAME = os.path.join(self._temp_dir.name, "test.db")
+        with mock.patch("builtins.print"):
+            storage.init_db()
+
+    def tearDown(self):
+        storage.DB_NAME = self._old_db_name
+        super().tearDown()
+
+    def test_only_cached_images_are_saved_to_the_database(self):
+        for name in "abcde":
+            storage.add_card(PokemonCard(name=name, set_name="Base Set", rarity="Common", image_url=f"http://img/{name}"))
+        with mock.patch.object(image_cache, "MAX_CACHE_BYTES", int(3.5 * IMAGE_BYTES)), mock.patch("builtins.print"):
+            cached = image_cache.prefetch_collection()
+
+        paths = [card.image_path for card in storage.get_all_cards()]
+        self.assertEqual(cached, 3)
+        self.assertEqual(sum(path is not None for path in paths), 3)
+        self.assertTrue(all(os.path.exists(path) for path in paths if path is not None))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+"""
+Tests for image_grading.py, using synthetic scans drawn with Pillow: a grey border around a dark
+"artwork" box, with rounded corners like a real card.
+
+Run with: python -m pytest tests
+"""
+
+import os
+import tempfile
+import unittest
+
+from PIL import Image, ImageDraw
+
+from pokeport.image_grading import find_card_bounds, grade_scan, load_grayscale
+
+BORDER = 180  # Grey level of the printed border
+ARTWORK = 90
+
+def draw_card(width=700, height=1000, left=40, right=40, top=50, bottom=50, radius=33, worn=False) -> Image.Image:
+    """A card with the given border widths. worn=True adds white chips along the left edge and a white corner."""
+    card = Image.new("L", (width, height), 0)
+    mask = Image.new("L", (width, height), 0)
+    ImageDraw.Draw(mask).rounded_rectangle((0, 0, width - 1, height - 1), radius=radius, fill=255)
+    draw = ImageDraw.Draw(card)
+    draw.rectangle((0, 0, width - 1, height - 1), fill=BORDER)
+    draw.rectangle((left, top, width - 1 - right, height - 1 - bottom), fill=ARTWORK)
+    if worn:
+        for y in range(150, height - 150, 60):
+            draw.rectangle((0, y, 7, y + 25), fill=255)
+        draw.rectangle((width - 50, height - 50, width - 1, height - 1), fill=255)
+    card.putalpha(mask)
+    return card
+
+def on_scanner(card: Image.Image, background: int, margin: int = 50) -> Image.Image:
+    """Place a card on a scanner bed of the given grey level."""
+    scan = Image.new("L", (card.width + 2 * margin, card.height + 2 * margin), background)
+    scan.paste(card.convert("L"), (margin, margin), card)
+    return scan
+
+class ImageGradingTestCase(unittest.TestCase):
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._temp_dir.cleanup)
+
+    def grade(self, image: Image.Image) -> dict:
+        path = os.path.join(self._temp_dir.name, "scan.png")
+        image.save(path)
+        return grade_scan(path)
+
+class TestWear(ImageGradingTestCase):
+    def test_clean_card_scores_full_marks_on_any_background(self):
+        for background in (255, 230, 30):
+            with self.subTest(background=background):
+                result = self.grade(on_scanner(draw_card(), background))
+                self.assertEqual((result["edges"], result["corners"]), (10.0, 10.0))
+
+    def test_whitening_shows_on_a_light_background(self):
+        for background in (255, 230, 30):
+            with self.subTest(background=background):
+                result = self.grade(on_scanner(draw_card(worn=True), background))
+                self.assertLess(result["edges"], 8.0)
+                self.assertLessEqual(result["corners"], 2.0)
+
+class TestCardBounds(ImageGradingTestCase):
+    def bounds(self, image: Image.Image):
+        path = os.path.join(self._temp_dir.name, "scan.png")
+        image.save(path)
+        return find_card_bounds(load_grayscale(path))
+
+    def test_card_on_a_scanner_bed_is_found(self):
+        card = draw_card(left=30, right=50)
+        for background, margin in ((255, 50), (30, 50), (240, 120)):
+            with self.subTest(background=background, margin=margin):
+                scan = on_scanner(card, background, margin)
+                self.assertEqual(self.bounds(scan), (margin, margin + card.height, margin, margin + card.width))
+
+    def test_card_far_from_the_middle_of_the_scan_is_found(self):
+        card = draw_card()
+        scan = Image.new("L", (card.width + 400, card.height + 300), 250)
+        scan.paste(card.convert("L"), (20, 260), card)
+        self.assertEqual(self.bounds(scan), (260, 260 + card.height, 20, 20 + card.width))
+
+    def test_cropped_scan_is_used_whole(self):
+        for radius, background in ((0, 255), (33, 255), (33, 20)):
+            with self.subTest(radius=radius, background=background):
+                scan = on_scanner(draw_card(left=30, right=50, radius=radius), background, margin=0)
+                self.assertEqual(self.bounds(scan), (0, scan.height, 0, scan.width))
+
+class TestCentering(ImageGradingTestCase):
+    def test_cropped_and_uncropped_scans_measure_the_same_borders(self):
+        card = draw_card(left=30, right=50, radius=0)
+        for scan in (on_scanner(card, 255, margin=0), on_scanner(draw_card(left=30, right=50), 255)):
+            result = self.grade(scan)
+            self.assertEqual(result["borders"], {"left": 30, "right": 50, "top": 50, "bottom": 50})
+            self.assertEqual(result["left_right"], (37.5, 62.5))
+            self.assertEqual(result["centering"], 8)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+"""
+Tests for interface/server.py: the card handlers, ETags and 304 replies, and bad input that has to
+get a 400 or 404 reply instead of a 500.
+
+Requests go straight to dispatch(), so no socket is opened. The search API is replaced by a mock.
+
+Run with: python -m pytest tests
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from interface import server
+from pokeport import storage
+
+PIKACHU = {"name": "Pikachu", "set_name": "Base Set", "rarity": "Common", "purchase_price": 5.0, "market_value": 8.0}
+
+class ServerTestCase(unittest.TestCase):
+    """A fresh database in a temporary folder for every test, and an empty search cache."""
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self._old_db_name = storage.DB_NAME
+        storage.DB_NAME = os.path.join(self._temp_dir.name, "test.db")
+        with mock.patch("builtins.print"):
+            storage.init_db()
+        server._search_cache = server.ResponseCache(server.SEARCH_CACHE_SIZE, server.SEARCH_CACHE_SECONDS)
+
+    def tearDown(self):
+        storage.close_write_queue()
+        storage.DB_NAME = self._old_db_name
+        self._temp_dir.cleanup()
+
+    def request(self, method: str, target: str, body=None, headers=None) -> server.Response:
+        path, _, query = target.partition("?")
+        raw = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8") if body is not None else b""
+        request = server.Request(method, path, server.parse_qs(query), headers or {}, raw)
+        with mock.patch("builtins.print"):
+            return asyncio.run(server.dispatch(request))
+
+    def assertStatus(self, response: server.Response, status: int) -> dict:
+        self.assertEqual(response.status, status, response.body)
+        return json.loads(response.body) if response.body else {}
+
+class TestCards(ServerTestCase):
+    def test_add_get_update_and_delete(self):
+        added = self.assertStatus(self.request("POST", "/cards", PIKACHU), 201)
+        self.assertEqual(added["name"], "Pikachu")
+        path = f"/cards/{added['id']}"
+
+        self.assertEqual(self.assertStatus(self.request("GET", path), 200)["market_value"], 8.0)
+        updated = self.assertStatus(self.request("PUT", path, {**PIKACHU, "market_value": 12.0, "quantity": 2}), 200)
+        self.assertEqual((updated["market_value"], updated["quantity"]), (12.0, 2))
+
+        listing = self.assertStatus(self.request("GET", "/cards?page=1&page_size=10"), 200)
+        self.assertEqual((listing["total"], listing["pages"]), (1, 1))
+        self.assertEqual(self.assertStatus(self.request("DELETE", path), 200), {"deleted": added["id"]})
+        self.assertStatus(self.request("GET", path), 404)
+
+    def test_updating_a_missing_card_is_not_found(self):
+        self.assertStatus(self.request("PUT", "/cards/999", PIKACHU), 404)
+        self.assertEqual(storage.get_all_cards(), [])
+
+    def test_unknown_path_and_method(self):
+        self.assertStatus(self.request("GET", "/nowhere"), 404)
+        self.assertStatus(self.request("PATCH", "/cards"), 405)
+
+class TestETags(ServerTestCase):
+    def test_unchanged_collection_gets_a_304(self):
+        first = self.request("GET", "/cards")
+        etag = first.headers["ETag"]
+        again = self.request("GET", "/cards", headers={"if-none-match": etag})
+        self.assertEqual((again.status, again.body, again.headers["ETag"]), (304, b"", etag))
+        self.assertStatus(self.request("GET", "/summary", headers={"if-none-match": etag}), 304)
+
+    def test_a_write_changes_the_etag(self):
+        etag = self.request("GET", "/cards").headers["ETag"]
+        self.assertStatus(self.request("POST", "/cards", PIKACHU), 201)
+        changed = self.request("GET", "/cards", headers={"if-none-match": etag})
+        self.assertEqual(self.assertStatus(changed, 200)["total"], 1)
+        self.assertNotEqual(changed.headers["ETag"], etag)
+
+    def test_search_is_cached_and_has_an_etag(self):
+        found = [{"id": "base1-58", "name": "Pikachu", "set": {"name": "Base Set"}, "rarity": "Common"}]
+        with mock.patch.object(server, "search_cards_by_name", return_value=found) as search_cards_by_name:
+            first = self.request("GET", "/search?name=Pikachu")
+            again = self.request("GET", "/search?name=pikachu", headers={"if-none-match": first.headers["ETag"]})
+        self.assertEqual(self.assertStatus(first, 200)["total"], 1)
+        self.assertEqual(again.status, 304)
+        search_cards_by_name.assert_called_once_with("Pikachu")
+
+class TestBadInput(ServerTestCase):
+    def test_numbers_too_big_for_the_database(self):
+        for target, body in (
+            ("/cards?page=1e300", None),
+            ("/cards?page=1000001", None),
+            ("/search?name=Pikachu&page=1e300", None),
+            ("/cards", {**PIKACHU, "quantity": 1e30}),
+            ("/cards", {**PIKACHU, "quantity": 100000000000000000000}),
+            ("/cards", {**PIKACHU, "quantity": True}),
+            ("/cards", {**PIKACHU, "purchase_price": "nan"}),
+        ):
+            with self.subTest(target=target, body=body):
+                self.assertStatus(self.request("POST" if body else "GET", target, body), 400)
+        self.assertEqual(storage.get_all_cards(), [])
+
+    def test_card_id_too_big_for_the_database(self):
+        huge = "9" * 30
+        for method, path in (("GET", f"/cards/{huge}"), ("DELETE", f"/cards/{huge}"),
+                             ("GET", f"/cards/{huge}/roi"), ("PUT", f"/cards/{2 ** 63}")):
+            with self.subTest(method=method, path=path):
+                self.assertStatus(self.request(method, path, PIKACHU if method == "PUT" else None), 404)
+
+    def test_fields_of_the_wrong_type(self):
+        for field, value in (("name", ["x"]), ("set_name", 3), ("rarity", {"a": 1}), ("name", ""),
+                             ("condition", None), ("condition", 7), ("api_id", ["base1-58"]),
+                             ("image_url", 5), ("image_path", True)):
+            with self.subTest(field=field, value=value):
+                self.assertStatus(self.request("POST", "/cards", {**PIKACHU, field: value}), 400)
+        self.assertEqual(storage.get_all_cards(), [])
+
+    def test_body_that_is_not_a_json_object(self):
+        self.assertStatus(self.request("POST", "/cards", b"{not json"), 400)
+        self.assertStatus(self.request("POST", "/cards", [PIKACHU]), 400)
+
+class TestReadRequest(unittest.TestCase):
+    def read(self, data: bytes):
+        async def run():
+            reader = asyncio.StreamReader()
+            reader.feed_data(data)
+            reader.feed_eof()
+            return await server._read_request(reader)
+        return asyncio.run(run())
+
+    def test_request_is_parsed(self):
+        request = self.read(b"POST /cards?page=2 HTTP/1.1\r\nContent-Length: 2\r\nIf-None-Match: \"v1\"\r\n\r\n{}")
+        self.assertEqual((request.method, request.path, request.arg("page")), ("POST", "/cards", "2"))
+        self.assertEqual((request.headers["if-none-match"], request.body), ('"v1"', b"{}"))
+
+    def test_negative_content_length_is_rejected(self):
+        with self.assertRaises(server.HTTPError) as raised:
+            self.read(b"POST /cards HTTP/1.1\r\nContent-Length: -5\r\n\r\n")
+        self.assertEqual(raised.exception.status, 400)
+
+    def test_short_body_means_the_client_left(self):
+        self.assertIsNone(self.read(b"POST /cards HTTP/1.1\r\nContent-Length: 10\r\n\r\n{}"))
+
+if __name__ == "__main__":
+    unittest.main()
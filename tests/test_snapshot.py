@@ -0,0 +1,152 @@
+"""
+Tests for snapshot.py: change tracking in storage, incremental refreshes against full rebuilds,
+and rebuilding when the snapshot came from another database.
+
+Run with: python -m pytest tests
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from pokeport import snapshot, storage
+from pokeport.models import PokemonCard
+
+def _card(name: str, set_name: str = "Base Set", **fields) -> PokemonCard:
+    values = {"rarity": "Common", "purchase_price": 2.0, "market_value": 3.0}
+    values.update(fields)
+    return PokemonCard(name=name, set_name=set_name, **values)
+
+class SnapshotTestCase(unittest.TestCase):
+    """A fresh database and snapshot folder in a temporary folder for every test."""
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self._old_db_name = storage.DB_NAME
+        self.path = os.path.join(self._temp_dir.name, "snapshot")
+        self.use_database("test.db")
+
+    def tearDown(self):
+        storage.DB_NAME = self._old_db_name
+        self._temp_dir.cleanup()
+
+    def use_database(self, name: str) -> None:
+        storage.DB_NAME = os.path.join(self._temp_dir.name, name)
+        with mock.patch("builtins.print"):
+            storage.init_db()
+
+    def assertSameColumns(self, first, second):
+        self.assertEqual(len(first), len(second))
+        for name in snapshot.COLUMNS:
+            if name in ("set_code", "rarity_code"):
+                # Codes can differ between builds, the names they stand for can't
+                names = {"set_code": "set_names", "rarity_code": "rarities"}[name]
+                self.assertEqual([getattr(first, names)[code] for code in first.columns[name]],
+                                 [getattr(second, names)[code] for code in second.columns[name]])
+            else:
+                np.testing.assert_array_equal(first.columns[name], second.columns[name])
+
+class TestChangeTracking(SnapshotTestCase):
+    def test_only_changed_entries_are_returned(self):
+        first = storage.add_card(_card("Pikachu"))
+        second = storage.add_card(_card("Mew"))
+        version, changed, rows = storage.get_card_rows()
+        self.assertIsNone(changed)
+        self.assertEqual([row[0] for row in rows], [first, second])
+
+        card = storage.get_card(second)
+        card.market_value = 9.0
+        storage.update_card(card)
+        third = storage.add_card(_card("Eevee"))
+        storage.delete_card(first)
+        new_version, changed, rows = storage.get_card_rows(since_version=version)
+
+        self.assertGreater(new_version, version)
+        self.assertEqual(changed, [first, second, third])
+        self.assertEqual([row[0] for row in rows], [second, third])  # The deleted entry has no row
+        self.assertEqual(storage.get_collection_version(), new_version)
+
+class TestSnapshot(SnapshotTestCase):
+    def test_incremental_refresh_matches_a_full_rebuild(self):
+        ids = [storage.add_card(_card(f"Card {i}", set_name=f"Set {i % 3}")) for i in range(20)]
+        snapshot.build_snapshot(self.path)
+
+        card = storage.get_card(ids[4])
+        card.market_value = 12.5
+        card.set_name = "Fossil"
+        storage.update_card(card)
+        storage.delete_card(ids[7])
+        storage.add_card(_card("Mew", set_name="Promo", grading_score=9.0))
+
+        with mock.patch.object(storage, "get_card_rows", wraps=storage.get_card_rows) as get_card_rows:
+            incremental = snapshot.build_snapshot(self.path)
+        get_card_rows.assert_called_once()
+        self.assertIsNotNone(get_card_rows.call_args.kwargs["since_version"])  # Only the changes were read
+
+        full = snapshot.build_snapshot(os.path.join(self._temp_dir.name, "full"), full=True)
+        self.assertSameColumns(incremental, full)
+        self.assertEqual(incremental.version, storage.get_collection_version())
+        self.assertEqual(float(incremental.market_value[list(incremental.id).index(ids[4])]), 12.5)
+
+    def test_unchanged_database_is_not_queried(self):
+        storage.add_card(_card("Pikachu"))
+        built = snapshot.build_snapshot(self.path)
+        with mock.patch.object(storage, "get_card_rows") as get_card_rows:
+            again = snapshot.build_snapshot(self.path)
+            current = snapshot.get_snapshot(self.path)
+        get_card_rows.assert_not_called()
+        self.assertEqual((again.version, current.version), (built.version, built.version))
+
+    def test_another_database_gets_a_full_rebuild(self):
+        for i in range(10):
+            storage.add_card(_card(f"Card {i}"))
+        snapshot.build_snapshot(self.path)
+
+        # Fewer changes, so the version is lower than the snapshot's
+        self.use_database("other.db")
+        storage.add_card(_card("Mew", set_name="Promo"))
+        self.assertEqual(len(snapshot.get_snapshot(self.path)), 1)
+
+        # Same file name but a new file, with a higher version than the snapshot
+        storage.DB_NAME = os.path.join(self._temp_dir.name, "test.db")
+        snapshot.build_snapshot(self.path)
+        shutil.move(storage.DB_NAME, os.path.join(self._temp_dir.name, "moved.db"))
+        self.use_database("test.db")
+        for i in range(15):
+            storage.add_card(_card(f"New {i}", set_name="Jungle"))
+        rebuilt = snapshot.build_snapshot(self.path)
+        self.assertEqual(len(rebuilt), 15)
+        self.assertEqual(rebuilt.set_names, ["Jungle"])
+
+    def test_each_build_gets_its_own_folder(self):
+        storage.add_card(_card("Pikachu"))
+        first = snapshot.build_snapshot(self.path)
+        storage.add_card(_card("Mew"))
+        second = snapshot.build_snapshot(self.path)
+
+        with open(os.path.join(self.path, "meta.json"), encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+        self.assertEqual(sorted(os.listdir(self.path)), sorted(["meta.json", meta["data_dir"]]))
+        self.assertEqual(meta["version"], second.version)
+        # A reader that opened the old build keeps a consistent view of it
+        self.assertEqual(len(first), 1)
+        self.assertEqual(len(first.id), len(first.market_value))
+
+    def test_roi_and_grades_come_from_the_columns(self):
+        storage.add_card(_card("Pikachu", purchase_price=10.0, market_value=15.0, quantity=2, grading_score=8.6))
+        storage.add_card(_card("Mew", set_name="Promo", purchase_price=20.0, market_value=10.0))
+        current = snapshot.get_snapshot(self.path)
+
+        roi = snapshot.collection_roi(current)
+        self.assertAlmostEqual(roi["total"], 0.0)
+        self.assertEqual(roi["per_set"], {"Base Set": 0.5, "Promo": -0.5})
+        # 8.6 rounds to a 9, and Mew has no grade so it isn't counted
+        self.assertEqual(snapshot.collection_grades(current), {grade: 2 if grade == 9 else 0 for grade in range(1, 11)})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,220 @@
+"""
+Tests for storage.py: the migration from the old single pokemon table, the summary triggers and
+updates to cards that don't exist.
+
+Run with: python -m pytest tests
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from concurrent.futures import CancelledError
+
+from pokeport import storage
+from pokeport.models import PokemonCard
+
+def _card(**fields) -> PokemonCard:
+    values = {"name": "Pikachu", "set_name": "Base Set", "rarity": "Common", "purchase_price": 5.0, "market_value": 8.0}
+    values.update(fields)
+    return PokemonCard(**values)
+
+class StorageTestCase(unittest.TestCase):
+    """Points storage at a fresh database file in a temporary folder for every test."""
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self._old_db_name = storage.DB_NAME
+        storage.DB_NAME = os.path.join(self._temp_dir.name, "test.db")
+
+    def tearDown(self):
+        storage.DB_NAME = self._old_db_name
+        self._temp_dir.cleanup()
+
+class TestMigration(StorageTestCase):
+    def test_old_table_is_split_into_catalog_entries_and_lots(self):
+        with sqlite3.connect(storage.DB_NAME) as connection:
+            connection.execute('''
+                CREATE TABLE pokemon (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, set_name TEXT NOT NULL,
+                    rarity TEXT NOT NULL, purchase_price REAL, market_value REAL, grading_score REAL,
+                    image_url TEXT, image_path TEXT)
+            ''')
+            connection.executemany(
+                'INSERT INTO pokemon (name, set_name, rarity, purchase_price, market_value, grading_score, image_url) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', [
+                    ("Pikachu", "Base Set", "Common", 2.0, 3.0, None, "https://images.pokemontcg.io/base1/58.png"),
+                    ("Pikachu", "Base Set", "Common", 4.0, 3.0, None, "https://images.pokemontcg.io/base1/58.png"),
+                    ("Charizard", "Base Set", "Rare Holo", 100.0, 250.0, 9.0, None),
+                ])
+        storage.init_db()
+
+        cards = {card.name: card for card in storage.get_all_cards()}
+        self.assertEqual(cards["Pikachu"].quantity, 2)
+        self.assertEqual(cards["Pikachu"].id, 1)  # The first copy keeps its old ID
+        self.assertEqual(cards["Pikachu"].api_id, "base1-58")
+        self.assertAlmostEqual(cards["Pikachu"].purchase_price, 3.0)
+        self.assertEqual(len(storage.get_purchase_lots(cards["Pikachu"].id)), 2)
+        self.assertEqual(cards["Charizard"].quantity, 1)
+
+        summary = storage.get_portfolio_summary()
+        self.assertEqual(summary["card_count"], 3)
+        self.assertAlmostEqual(summary["total_cost"], 106.0)
+        self.assertEqual(storage.check_summary_consistency(), [])
+
+class TestSummaryTriggers(StorageTestCase):
+    def setUp(self):
+        super().setUp()
+        storage.init_db()
+
+    def test_totals_follow_adds_updates_and_deletes(self):
+        first = storage.add_card(_card())
+        second = storage.add_card(_card(name="Mew", set_name="Promo", purchase_price=20.0, market_value=30.0))
+        storage.add_purchase_lot(first, 2, 6.0)
+        card = storage.get_card(second)
+        card.set_name = "Fossil"
+        card.quantity = 3
+        storage.update_card(card)
+        storage.delete_card(first)
+
+        self.assertEqual(storage.get_portfolio_summary(), {"card_count": 3, "total_cost": 60.0, "total_value": 90.0})
+        self.assertEqual([s["set_name"] for s in storage.get_set_summaries()], ["Fossil"])
+        self.assertEqual(storage.check_summary_consistency(), [])
+
+    def test_adding_a_copy_keeps_the_value_of_copies_already_owned(self):
+        first = storage.add_card(_card(market_value=3.0))
+        self.assertEqual(storage.add_card(_card(market_value=3.0)), first)  # Same card and value: merged
+        second = storage.add_card(_card(market_value=5.0))
+
+        self.assertNotEqual(second, first)
+        self.assertEqual(storage.get_card(first).quantity, 2)
+        self.assertEqual(storage.get_card(first).market_value, 3.0)
+        self.assertEqual(storage.get_portfolio_summary()["total_value"], 11.0)
+
+    def test_updating_a_missing_card_changes_nothing(self):
+        storage.add_card(_card())
+        with self.assertRaises(ValueError):
+            storage.update_card(_card(id=999, purchase_price=7.0))
+
+        self.assertAlmostEqual(storage.get_portfolio_summary()["total_cost"], 5.0)
+        self.assertEqual(len(storage.get_all_cards()), 1)
+        self.assertEqual(storage.check_summary_consistency(), [])
+
+    def test_write_queue_reports_a_missing_card(self):
+        storage.add_card(_card())
+        with storage.WriteQueue(storage.DB_NAME) as write_queue:
+            future = write_queue.update_card(_card(id=999, purchase_price=7.0))
+            with self.assertRaises(ValueError):
+                future.result(timeout=5)
+        self.assertAlmostEqual(storage.get_portfolio_summary()["total_cost"], 5.0)
+
+    def test_editing_an_api_card_updates_the_catalog(self):
+        card_id = storage.add_card(_card(api_id="base1-58"))
+        storage.add_card(_card(api_id="base1-58", condition="Played"))
+        card = storage.get_card(card_id)
+        card.name = "Pikachu (Red Cheeks)"
+        card.set_name = "Base Set Shadowless"
+        storage.update_card(card)
+
+        self.assertEqual({c.name for c in storage.get_all_cards()}, {"Pikachu (Red Cheeks)"})
+        self.assertEqual([(s["set_name"], s["card_count"]) for s in storage.get_set_summaries()],
+                         [("Base Set Shadowless", 2)])
+        self.assertEqual(storage.check_summary_consistency(), [])
+
+    def test_zero_quantity_keeps_a_purchase_price(self):
+        card_id = storage.add_card(_card())
+        card = storage.get_card(card_id)
+        card.quantity = 0
+        storage.update_card(card)
+        self.assertEqual(storage.get_card(card_id).purchase_price, 5.0)
+
+    def test_consistency_check_ignores_lots_without_an_entry(self):
+        storage.add_card(_card())
+        # An orphan lot (e.g. left behind by an older version) is not part of the collection
+        with sqlite3.connect(storage.DB_NAME) as connection:
+            connection.execute('INSERT INTO purchase_lot (entry_id, quantity, unit_price) VALUES (999, 1, 7.0)')
+        self.assertNotEqual(storage.check_summary_consistency(repair=True), [])
+        self.assertAlmostEqual(storage.get_portfolio_summary()["total_cost"], 5.0)
+
+class TestCardView(StorageTestCase):
+    def _replace_view(self, sql):
+        with sqlite3.connect(storage.DB_NAME, isolation_level=None) as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute('DROP VIEW pokemon')
+            connection.execute(sql)
+            connection.execute('COMMIT')
+
+    def test_old_view_is_replaced(self):
+        storage.init_db()
+        storage.add_card(_card())
+        self._replace_view('CREATE VIEW pokemon AS SELECT id FROM collection_entry')
+        storage.init_db()
+        self.assertEqual(storage.get_all_cards()[0].name, "Pikachu")
+
+    def test_init_db_leaves_a_current_view_alone(self):
+        # Dropping and re-creating the view on every start would let other connections see it missing
+        storage.init_db()
+        with sqlite3.connect(storage.DB_NAME) as connection:
+            before = connection.execute('PRAGMA schema_version').fetchone()[0]
+        storage.init_db()
+        with sqlite3.connect(storage.DB_NAME) as connection:
+            self.assertEqual(connection.execute('PRAGMA schema_version').fetchone()[0], before)
+
+class TestWriteQueue(StorageTestCase):
+    def setUp(self):
+        super().setUp()
+        storage.init_db()
+
+    def test_concurrent_producers_all_get_committed(self):
+        ids = []
+        ids_lock = threading.Lock()
+        with storage.WriteQueue(storage.DB_NAME) as write_queue:
+            def produce(producer):
+                futures = [write_queue.add_card(_card(name=f"Card {producer}-{i}")) for i in range(50)]
+                with ids_lock:
+                    ids.extend(future.result(timeout=10) for future in futures)
+
+            threads = [threading.Thread(target=produce, args=(producer,)) for producer in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(set(ids)), 400)
+        self.assertEqual(len(storage.get_all_cards()), 400)
+        self.assertEqual(storage.get_portfolio_summary()["card_count"], 400)
+        self.assertEqual(storage.check_summary_consistency(), [])
+
+    def test_one_bad_write_does_not_fail_its_batch(self):
+        with storage.WriteQueue(storage.DB_NAME, max_delay=0.2) as write_queue:
+            good = write_queue.add_card(_card())
+            bad = write_queue.add_card(_card(name="Broken", quantity=-1))  # Fails the CHECK constraint
+            also_good = write_queue.add_card(_card(name="Mew"))
+            self.assertIsInstance(bad.exception(timeout=5), sqlite3.IntegrityError)
+            self.assertEqual(sorted([good.result(), also_good.result()]), [1, 2])
+        self.assertEqual({card.name for card in storage.get_all_cards()}, {"Pikachu", "Mew"})
+
+    def test_cancelled_write_is_skipped(self):
+        with storage.WriteQueue(storage.DB_NAME, max_delay=0.2) as write_queue:
+            cancelled = write_queue.add_card(_card(name="Cancelled"))
+            self.assertTrue(cancelled.cancel())
+            kept = write_queue.add_card(_card())
+            self.assertEqual(kept.result(timeout=5), 1)
+            # The writer thread is still running after meeting a cancelled Future
+            self.assertEqual(write_queue.add_card(_card(name="Mew")).result(timeout=5), 2)
+        with self.assertRaises(CancelledError):
+            cancelled.result()
+        self.assertEqual({card.name for card in storage.get_all_cards()}, {"Pikachu", "Mew"})
+
+    def test_close_commits_waiting_writes(self):
+        write_queue = storage.WriteQueue(storage.DB_NAME, max_delay=10)
+        futures = [write_queue.add_card(_card(name=f"Card {i}")) for i in range(5)]
+        write_queue.close()
+        self.assertTrue(all(future.done() for future in futures))
+        self.assertEqual(len(storage.get_all_cards()), 5)
+        with self.assertRaises(RuntimeError):
+            write_queue.add_card(_card())
+
+if __name__ == "__main__":
+    unittest.main()